@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import tempfile
+from helpers.bucket import (
+    bucket_chunked_upload_v2,
+    download_blob_to_file,
+    delete_blobs,
+    get_storage_client,
+    invalidate_bucket_registry,
+)
+from helpers.storage_backend import STORAGE_BACKEND
+from models.bucket_object import BucketObject
+
+# Upload a file of random content to a bucket and download it back, with
+# the storage backend selected by STORAGE_BACKEND, and print the time and
+# throughput of both. Usage: benchmark_bucket_transfers.py <bucket> [MB]
+
+
+def benchmark_bucket_transfers(bucket_name, size_mb=1024):
+    storage_client = get_storage_client()
+    if STORAGE_BACKEND == "local":
+        storage_client.create_bucket(bucket_name)
+        invalidate_bucket_registry()
+    bucket = storage_client.bucket(bucket_name)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        local_file_path = os.path.join(temp_dir, "upload.bin")
+        with open(local_file_path, "wb") as file:
+            for _ in range(size_mb):
+                file.write(os.urandom(1024 * 1024))
+
+        started = time.monotonic()
+        result = bucket_chunked_upload_v2(
+            local_file_path,
+            "benchmark",
+            f"{int(time.time())}.bin",
+            None,
+            bucket_name,
+            None,
+        )
+        upload_seconds = time.monotonic() - started
+
+        bucket_object = BucketObject.get(bucket_name, result["blob_name"])
+        started = time.monotonic()
+        download_blob_to_file(
+            bucket, bucket_object, os.path.join(temp_dir, "download.bin")
+        )
+        download_seconds = time.monotonic() - started
+
+    delete_blobs([bucket.blob(result["blob_name"])])
+    BucketObject.delete(bucket_name, result["blob_name"])
+
+    for name, seconds in (
+        ("upload", upload_seconds),
+        ("download", download_seconds),
+    ):
+        print(
+            f"{name}: {size_mb} MB in {seconds:.2f} s, "
+            f"{size_mb / seconds:.1f} MB/s"
+        )
+
+
+if __name__ == "__main__":
+    benchmark_bucket_transfers(
+        sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    )
@@ -10,11 +10,38 @@ fi
 PRIMERS_FILE="$1"
 FASTQ_FILE="$2"
 
-# Loop through each line in the primers file
-while IFS= read -r sequence; do
-  # Count occurrences of the sequence in the .fastq.gz file
-  count=$(zgrep -o "$sequence" "$FASTQ_FILE" | wc -l)
-  
-  # Print the result in the format: sequence: count
-  echo "$sequence: $count"
-done < "$PRIMERS_FILE"
\ No newline at end of file
+# Decompress the file once and count, for every primer, the reads whose
+# sequence (the second line of each record) contains it. IUPAC codes of the
+# primers match any of the bases they stand for
+zcat -f "$FASTQ_FILE" | awk '
+  # The primers file, NR == FNR would also hold for the reads without primers
+  FILENAME == ARGV[1] {
+    sub(/\r$/, "")
+    if ($0 == "") next
+    primers[++n] = $0
+    regex = toupper($0)
+    gsub(/U/, "T", regex)
+    gsub(/R/, "[AG]", regex)
+    gsub(/Y/, "[CT]", regex)
+    gsub(/S/, "[CG]", regex)
+    gsub(/W/, "[AT]", regex)
+    gsub(/K/, "[GT]", regex)
+    gsub(/M/, "[AC]", regex)
+    gsub(/B/, "[CGT]", regex)
+    gsub(/D/, "[AGT]", regex)
+    gsub(/H/, "[ACT]", regex)
+    gsub(/V/, "[ACG]", regex)
+    gsub(/[NI]/, "[ACGT]", regex)
+    regexes[n] = regex
+    next
+  }
+  FNR % 4 == 2 {
+    for (i = 1; i <= n; i++) {
+      if ($0 ~ regexes[i]) counts[i]++
+    }
+  }
+  END {
+    # Print the result in the format: sequence: count
+    for (i = 1; i <= n; i++) print primers[i] ": " counts[i] + 0
+  }
+' "$PRIMERS_FILE" -
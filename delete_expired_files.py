@@ -1,4 +1,8 @@
-from helpers.bucket import delete_buckets_archive_files
+from helpers.bucket import (
+    delete_buckets_archive_files,
+    delete_abandoned_upload_parts,
+)
 
 if __name__ == "__main__":
     delete_buckets_archive_files()
+    delete_abandoned_upload_parts()
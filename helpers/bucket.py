@@ -1,31 +1,230 @@
+import io
 import os
 import json
+import mimetypes
 import logging
 import datetime
 import zipfile
 import re
-import shutil
 import gzip
 import csv
 import base64
-from collections import OrderedDict
+import hashlib
+import threading
+import time
+import uuid
+import random
+import psutil
+import requests
+import google_crc32c
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Library about google cloud storage
 from google.cloud import storage
+from google.api_core.exceptions import GoogleAPICallError, NotFound
+from google.auth.exceptions import TransportError
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 from models.upload import Upload
 from models.bucket import Bucket
+from models.bucket_object import BucketObject
+from models.bucket_archive_manifest import BucketArchiveManifest
+from models.bucket_upload_session import BucketUploadSession
 from models.db_model import (
     SequencingFilesUploadedTable,
 )
 from helpers.dbm import connect_db, get_session
+from helpers.cache import get_cached, invalidate_cached
+from helpers.storage_backend import STORAGE_BACKEND, LocalClient
 
 logger = logging.getLogger("my_app_logger")  # Use the same name as in app.py
 
+# Files up to this size are uploaded with a single request, larger ones are
+# split into parts that are uploaded in parallel and composed in the bucket
+DIRECT_UPLOAD_MAX_SIZE = 30 * 1024 * 1024
+# Number of parts uploaded at the same time for a single file
+BUCKET_UPLOAD_WORKERS = int(os.environ.get("BUCKET_UPLOAD_WORKERS", 8))
+# Size of the first parts, before we have measured any throughput
+INITIAL_PART_SIZE = 30 * 1024 * 1024
+MIN_PART_SIZE = 8 * 1024 * 1024
+MAX_PART_SIZE = 256 * 1024 * 1024
+# The part size is tuned so that one part takes about this long to upload
+TARGET_PART_SECONDS = 15
+# Google Cloud Storage accepts at most 32 source objects per compose request
+COMPOSE_MAX_COMPONENTS = 32
+# Deletions sent in a single batch request
+BATCH_DELETE_SIZE = 100
+# Transient errors are retried until this many attempts have been made,
+# waiting about twice as long every time, with jitter so that the threads
+# and workers that failed together do not retry together
+BUCKET_RETRY_ATTEMPTS = int(os.environ.get("BUCKET_RETRY_ATTEMPTS", 5))
+BUCKET_RETRY_INITIAL_DELAY = 1
+BUCKET_RETRY_MAX_DELAY = 60
+# Throttling and server errors, the request can succeed if sent again
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+# Files of a folder uploaded at the same time when it is synced to a bucket
+BUCKET_SYNC_WORKERS = int(os.environ.get("BUCKET_SYNC_WORKERS", 4))
+# Metadata requests sent at the same time when many blobs are checked at once
+BUCKET_STAT_WORKERS = int(os.environ.get("BUCKET_STAT_WORKERS", 16))
+# Parts are streamed from disk in requests of this size (a multiple of
+# 256 KB), so every upload thread holds at most one such buffer in memory,
+# whatever the size of the file or of the part
+STREAM_CHUNK_SIZE = int(
+    os.environ.get("BUCKET_UPLOAD_STREAM_CHUNK_SIZE", 16 * 1024 * 1024)
+)
+# The members of the bucket archives are kept in these blobs, so that the
+# next archive can reuse the ones that have not changed
+ARCHIVE_SEGMENTS_PREFIX = "archive/segments/"
+# .fastq blobs are compressed by this many threads, zlib releasing the GIL
+GZIP_WORKERS = int(os.environ.get("GZIP_WORKERS") or os.cpu_count() or 4)
+# Number of .fastq blobs compressed at the same time
+GZIP_CONCURRENT_BLOBS = int(os.environ.get("GZIP_CONCURRENT_BLOBS", 4))
+GZIP_COMPRESS_LEVEL = 6
+# Segments are deleted when no archive has been created for this long
+ARCHIVE_SEGMENTS_MAX_AGE_DAYS = 7
+# An archive is rebuilt from scratch when the members it can reuse make up
+# less than this share of the bytes of the segments
+ARCHIVE_MIN_REUSED_RATIO = 0.5
+
+# Connections kept open to the storage API by the shared client, enough for
+# the upload threads of a few files at the same time
+BUCKET_HTTP_POOL_SIZE = int(os.environ.get("BUCKET_HTTP_POOL_SIZE", 32))
+
+# The bucket list and IAM users are cached in Redis for this many seconds
+REGISTRY_CACHE_TTL = int(os.environ.get("REGISTRY_CACHE_TTL", 900))
+
+# Storage clients of this process, by credentials
+storage_clients = {}
+storage_clients_lock = threading.Lock()
+
+
+def forget_storage_clients():
+    # A forked child (e.g. a Celery worker) must not share the connections
+    # of its parent, it creates its own clients on first use
+    global storage_clients_lock
+    storage_clients.clear()
+    storage_clients_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=forget_storage_clients)
+
+
+def get_storage_client(credentials=None):
+    """
+    Return the storage client of this process for these credentials, or
+    for the default credentials, creating it on first use.
+
+    Creating a client loads the credentials and opens a new pool of
+    connections, so the client is shared by all the calls of the process
+    instead, with a pool large enough for the parallel uploads.
+
+    With STORAGE_BACKEND set to "local", the buckets are directories of
+    the local disk instead, see helpers/storage_backend.py.
+    """
+    if credentials is None:
+        key = None
+    else:
+        key = getattr(credentials, "service_account_email", None) or id(
+            credentials
+        )
+
+    with storage_clients_lock:
+        storage_client = storage_clients.get(key)
+        if storage_client is None and STORAGE_BACKEND == "local":
+            storage_client = LocalClient()
+            storage_clients[key] = storage_client
+        elif storage_client is None:
+            storage_client = storage.Client(credentials=credentials)
+            adapter = HTTPAdapter(
+                pool_connections=BUCKET_HTTP_POOL_SIZE,
+                pool_maxsize=BUCKET_HTTP_POOL_SIZE,
+            )
+            storage_client._http.mount("https://", adapter)
+            storage_clients[key] = storage_client
+
+    return storage_client
+
+
+def index_blob(bucket_name, blob):
+    # Record a blob that we have just written in the bucket objects index
+    BucketObject.upsert(
+        bucket_name,
+        blob.name,
+        blob.size,
+        blob.md5_hash,
+        blob.crc32c,
+        blob.time_created,
+        blob.generation,
+    )
+
+
+def reconcile_bucket_objects(bucket_name=None):
+    """
+    Make the bucket objects index match the actual content of the buckets,
+    or of bucket_name only, for the objects created or deleted outside of
+    the application. This is the only place where every blob is listed.
+    """
+    storage_client = get_storage_client()
+    if bucket_name is None:
+        bucket_names = list(fetch_buckets())
+    else:
+        bucket_names = [bucket_name]
+
+    for name in bucket_names:
+        # Taken before the listing, on the clock of the database
+        listed_at = BucketObject.get_database_time()
+        bucket_objects = [
+            {
+                "name": blob.name,
+                "size": blob.size,
+                "md5_hash": blob.md5_hash,
+                "crc32c": blob.crc32c,
+                "time_created": blob.time_created,
+                "generation": blob.generation,
+            }
+            for blob in storage_client.list_blobs(name)
+        ]
+        added, updated, deleted = BucketObject.reconcile(
+            name, bucket_objects, listed_at
+        )
+        Bucket.update_objects_reconciled_at(name, listed_at)
+        logger.info(
+            f"Reconciled the objects index of bucket '{name}': "
+            f"{len(bucket_objects)} objects, {added} added, "
+            f"{updated} updated, {deleted} deleted."
+        )
+
+
+def ensure_bucket_objects_indexed(bucket_name):
+    # The objects of the buckets that existed before the index are missing
+    # from it until the bucket is reconciled, even once our own uploads
+    # have added rows for it, so list the bucket once first
+    bucket = Bucket.get(bucket_name)
+    if bucket is None or bucket.objects_reconciled_at is None:
+        reconcile_bucket_objects(bucket_name)
+
 
 def list_buckets():
+    """
+    Return the buckets of the project, {name: location}, from the registry
+    cached in Redis, shared by the Flask and Celery processes.
+    """
+    return get_cached("registry:buckets", REGISTRY_CACHE_TTL, fetch_buckets)
+
+
+def invalidate_bucket_registry(bucket_name=None):
+    # Drop the cached bucket list when buckets are created or deleted, or
+    # only the cached IAM users of bucket_name when its permissions change
+    if bucket_name is None:
+        invalidate_cached("registry:buckets")
+    else:
+        invalidate_cached(f"registry:bucket_role_users:{bucket_name}:*")
+
+
+def fetch_buckets():
     # Instantiates a client
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
 
     # List the buckets in the project
     buckets = list(storage_client.list_buckets())
@@ -89,6 +288,852 @@ def get_progress_db_bucket(process_id, upload_type, file_id=""):
     return progress
 
 
+class FileRange:
+    """
+    Read-only file object over the bytes [offset, offset + length) of a
+    local file. Positions are relative to the start of the range, which is
+    what the upload session expects when it seeks back to resend a chunk.
+    If a StreamDigest is given, every buffer read is also fed to it.
+
+    The CRC32C of the range itself is kept in self.crc32c, so that it can
+    be checked against the crc32c of the blob the range was uploaded to.
+    """
+
+    def __init__(self, path, offset, length, digest=None):
+        self.file = open(path, "rb")
+        self.offset = offset
+        self.length = length
+        self.position = 0
+        self.digest = digest
+        self.crc32c = google_crc32c.Checksum()
+        self.crc32c_position = 0
+        self.file.seek(offset)
+
+    def read(self, size=-1):
+        remaining = self.length - self.position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = self.file.read(size)
+        if self.digest is not None:
+            # Hash the same buffer that is about to be uploaded
+            self.digest.update(self.offset + self.position, data)
+        # Bytes read again after a retry are already in the CRC32C
+        already_hashed = self.crc32c_position - self.position
+        if 0 <= already_hashed < len(data):
+            self.crc32c.update(data[already_hashed:])
+            self.crc32c_position = self.position + len(data)
+        self.position += len(data)
+        return data
+
+    def seek(self, position, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            position += self.position
+        elif whence == io.SEEK_END:
+            position += self.length
+        self.position = min(max(position, 0), self.length)
+        self.file.seek(self.offset + self.position)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PeakRssMonitor:
+    """
+    Samples the resident memory of the current process in a background
+    thread while an upload runs. Celery workers run one task per process,
+    so the peak is the memory that a single upload needs.
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.start_rss = self.process.memory_info().rss
+        self.peak_rss = self.start_rss
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
+        self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+
+def get_upload_memory_ceiling(workers=None):
+    # Upper bound of the upload buffers held in memory by one transfer:
+    # one chunk per upload thread, plus as much again for the chunks that
+    # wait in a StreamDigest to be hashed in order
+    if workers is None:
+        workers = BUCKET_UPLOAD_WORKERS
+    return 2 * workers * STREAM_CHUNK_SIZE
+
+
+# Reversed Castagnoli polynomial used by CRC32C
+CRC32C_POLYNOMIAL = 0x82F63B78
+
+
+def gf2_matrix_times(matrix, vector):
+    total = 0
+    row = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[row]
+        vector >>= 1
+        row += 1
+    return total
+
+
+def gf2_matrix_square(matrix):
+    return [gf2_matrix_times(matrix, matrix[row]) for row in range(32)]
+
+
+def crc32c_combine(crc1, crc2, length2):
+    """
+    CRC32C of the concatenation of two byte strings, from the CRC32C of
+    each of them and the length of the second one. Same algorithm as
+    crc32_combine in zlib, with the CRC32C polynomial.
+    """
+    if length2 <= 0:
+        return crc1
+
+    # Operator for one zero bit, then for two and four zero bits
+    odd = [CRC32C_POLYNOMIAL] + [1 << row for row in range(31)]
+    even = gf2_matrix_square(odd)
+    odd = gf2_matrix_square(even)
+
+    # Apply length2 zero bytes to crc1, squaring the operator each time
+    while True:
+        even = gf2_matrix_square(odd)
+        if length2 & 1:
+            crc1 = gf2_matrix_times(even, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+
+        odd = gf2_matrix_square(even)
+        if length2 & 1:
+            crc1 = gf2_matrix_times(odd, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+
+    return crc1 ^ crc2
+
+
+def crc32c_to_int(crc32c):
+    # Accepts a google_crc32c.Checksum or the base64 string used by blobs
+    if isinstance(crc32c, str):
+        return int.from_bytes(base64.b64decode(crc32c), "big")
+    return int.from_bytes(crc32c.digest(), "big")
+
+
+def crc32c_to_base64(crc32c):
+    return base64.b64encode(crc32c.to_bytes(4, "big")).decode("utf-8")
+
+
+class StreamDigest:
+    """
+    MD5 and CRC32C of a file, computed from the buffers that are read to
+    upload it, so the file is read from disk only once.
+
+    Parts are read concurrently, so buffers can arrive ahead of the
+    position hashed so far. They are kept until the gap before them is
+    filled, and readers that are ahead wait while more than max_pending
+    bytes are kept. The reader of the lowest part is never ahead, so the
+    uploads always make progress. Buffers read again when an upload
+    request is retried are ignored.
+    """
+
+    def __init__(self, max_pending=None):
+        if max_pending is None:
+            max_pending = BUCKET_UPLOAD_WORKERS * STREAM_CHUNK_SIZE
+        self.max_pending = max_pending
+        self.md5 = hashlib.md5()
+        self.crc32c = google_crc32c.Checksum()
+        self.position = 0
+        self.pending = {}
+        self.pending_bytes = 0
+        self.aborted = False
+        self.condition = threading.Condition()
+
+    def update(self, offset, data):
+        with self.condition:
+            while (
+                offset > self.position
+                and self.pending_bytes + len(data) > self.max_pending
+            ):
+                if self.aborted:
+                    raise RuntimeError("Upload aborted")
+                self.condition.wait()
+
+            if offset > self.position:
+                if offset in self.pending:
+                    self.pending_bytes -= len(self.pending[offset])
+                self.pending[offset] = data
+                self.pending_bytes += len(data)
+                return
+
+            self.consume(offset, data)
+            while self.pending and min(self.pending) <= self.position:
+                pending_offset = min(self.pending)
+                pending_data = self.pending.pop(pending_offset)
+                self.pending_bytes -= len(pending_data)
+                self.consume(pending_offset, pending_data)
+            self.condition.notify_all()
+
+    def consume(self, offset, data):
+        already_hashed = self.position - offset
+        if already_hashed >= len(data):
+            return
+        if already_hashed > 0:
+            data = data[already_hashed:]
+        self.md5.update(data)
+        self.crc32c.update(data)
+        self.position += len(data)
+
+    def abort(self):
+        # Release the readers waiting for a part that failed to upload
+        with self.condition:
+            self.aborted = True
+            self.condition.notify_all()
+
+    def md5_hexdigest(self):
+        return self.md5.hexdigest()
+
+    def crc32c_base64(self):
+        # Same encoding as the crc32c property of the blobs
+        return crc32c_to_base64(crc32c_to_int(self.crc32c))
+
+
+class LocalFileDigests:
+    """
+    MD5 and CRC32C of a local file, read from disk the first time they are
+    needed only, so that files without any candidate content in the bucket
+    are not read an extra time before being uploaded.
+
+    The digests already known, e.g. recorded by an earlier upload of the
+    file, are given as md5 (hex) and crc32c (base64), and the file is only
+    read for a digest that is missing.
+    """
+
+    def __init__(self, path, md5=None, crc32c=None):
+        self.path = path
+        self.digest = None
+        self.known_md5 = md5
+        self.known_crc32c = crc32c
+
+    def compute(self):
+        if self.digest is None:
+            digest = StreamDigest()
+            offset = 0
+            with open(self.path, "rb") as file:
+                while True:
+                    data = file.read(STREAM_CHUNK_SIZE)
+                    if not data:
+                        break
+                    digest.update(offset, data)
+                    offset += len(data)
+            self.digest = digest
+        return self.digest
+
+    @property
+    def md5(self):
+        if self.known_md5 is None:
+            self.known_md5 = self.compute().md5_hexdigest()
+        return self.known_md5
+
+    @property
+    def crc32c(self):
+        if self.known_crc32c is None:
+            self.known_crc32c = self.compute().crc32c_base64()
+        return self.known_crc32c
+
+    def matches(self, bucket_object, size):
+        # Works with blobs and with BucketObject rows of the index
+        if bucket_object.size != size:
+            return False
+
+        # Only the digest that the object is compared with is needed
+        if bucket_object.md5_hash:
+            status = verify_blob_checksums(bucket_object, self.md5, None)
+        elif bucket_object.crc32c:
+            status = verify_blob_checksums(bucket_object, None, self.crc32c)
+        else:
+            return False
+        if status not in ("md5_verified", "crc32c_verified"):
+            return False
+
+        # The object has the same content, so its other digest is the one
+        # of the file too
+        if self.known_md5 is None and bucket_object.md5_hash:
+            self.known_md5 = base64.b64decode(bucket_object.md5_hash).hex()
+        if self.known_crc32c is None and bucket_object.crc32c:
+            self.known_crc32c = bucket_object.crc32c
+        return True
+
+
+class PartSizeTuner:
+    """
+    Picks the size of the next part to upload from the throughput measured
+    on the parts that have already been uploaded, so that a single part
+    takes about TARGET_PART_SECONDS to send on this connection.
+    """
+
+    def __init__(self, initial_size=INITIAL_PART_SIZE):
+        self.part_size = initial_size
+        self.bytes_sent = 0
+        self.seconds_spent = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, nbytes, seconds):
+        with self.lock:
+            self.bytes_sent += nbytes
+            self.seconds_spent += seconds
+            if self.seconds_spent <= 0:
+                return
+            # Throughput of a single upload stream, in bytes per second
+            throughput = self.bytes_sent / self.seconds_spent
+            self.part_size = min(
+                max(int(throughput * TARGET_PART_SECONDS), MIN_PART_SIZE),
+                MAX_PART_SIZE,
+            )
+
+
+def get_blob_name(destination_upload_directory, destination_blob_name):
+    if destination_upload_directory:
+        return f"{destination_upload_directory}/{destination_blob_name}"
+    return f"{destination_blob_name}"
+
+
+def compose_blob_parts(bucket, blob_name, part_blobs, workers=None):
+    """
+    Compose the part blobs, in order, into the blob called blob_name.
+    Compose accepts at most COMPOSE_MAX_COMPONENTS sources, so bigger sets
+    are first composed into intermediate blobs, level by level, until few
+    enough remain for the final compose.
+
+    Returns the composed blob and the intermediate blobs that were created,
+    so that the caller can delete them together with the parts.
+    """
+    if workers is None:
+        workers = BUCKET_UPLOAD_WORKERS
+
+    intermediate_blobs = []
+    level = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while len(part_blobs) > COMPOSE_MAX_COMPONENTS:
+            groups = [
+                part_blobs[index : index + COMPOSE_MAX_COMPONENTS]  # noqa
+                for index in range(0, len(part_blobs), COMPOSE_MAX_COMPONENTS)
+            ]
+            level_blobs = [
+                bucket.blob(f"{blob_name}.compose{level}_{group_num}")
+                for group_num in range(len(groups))
+            ]
+            list(
+                executor.map(
+                    lambda pair: pair[0].compose(pair[1]),
+                    zip(level_blobs, groups),
+                )
+            )
+            intermediate_blobs.extend(level_blobs)
+            part_blobs = level_blobs
+            level += 1
+
+    blob = bucket.blob(blob_name)
+    blob.compose(part_blobs)
+
+    return blob, intermediate_blobs
+
+
+class BucketTransferError(Exception):
+    """
+    Some of the files of a batch could not be transferred, the others were.
+    failed maps the names of the files that failed to their errors.
+    """
+
+    def __init__(self, failed):
+        self.failed = failed
+        super().__init__(
+            f"Could not transfer {len(failed)} file(s): "
+            + ", ".join(sorted(failed))
+        )
+
+    @property
+    def retryable(self):
+        return all(is_retryable_error(e) for e in self.failed.values())
+
+
+def is_retryable_error(error):
+    """
+    True for the errors that can go away by themselves: throttling, server
+    errors, timeouts and dropped connections. Checksum mismatches, missing
+    objects or permissions and bad requests are fatal.
+    """
+    if isinstance(error, BucketTransferError):
+        return error.retryable
+    if isinstance(error, GoogleAPICallError):
+        return error.code in RETRYABLE_STATUS_CODES
+    if isinstance(error, requests.exceptions.HTTPError):
+        return (
+            error.response is not None
+            and error.response.status_code in RETRYABLE_STATUS_CODES
+        )
+    return isinstance(
+        error,
+        (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            ConnectionError,
+            TimeoutError,
+            TransportError,
+        ),
+    )
+
+
+def get_backoff_delay(attempt, initial_delay, max_delay):
+    # Exponential backoff, half of it random
+    delay = min(max_delay, initial_delay * 2**attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def retry_with_backoff(function, *args, **kwargs):
+    """
+    Call function, and call it again after a growing delay while it fails
+    with a retryable error, up to BUCKET_RETRY_ATTEMPTS times in all.
+    """
+    for attempt in range(BUCKET_RETRY_ATTEMPTS):
+        try:
+            return function(*args, **kwargs)
+        except Exception as e:
+            if attempt + 1 >= BUCKET_RETRY_ATTEMPTS or (
+                not is_retryable_error(e)
+            ):
+                raise
+            delay = get_backoff_delay(
+                attempt, BUCKET_RETRY_INITIAL_DELAY, BUCKET_RETRY_MAX_DELAY
+            )
+            logger.warning(
+                f"Retrying {function.__name__} in {delay:.1f} seconds "
+                f"after: {e}"
+            )
+            time.sleep(delay)
+
+
+def delete_blobs(blobs, workers=None):
+    """
+    Delete blobs, of any buckets, with batch requests of up to
+    BATCH_DELETE_SIZE deletions sent by a pool of threads. Blobs that are
+    already gone are ignored.
+    """
+    if workers is None:
+        workers = BUCKET_UPLOAD_WORKERS
+
+    blobs = list(blobs)
+    if not blobs:
+        return
+
+    def delete_batch(batch_blobs):
+        try:
+            with batch_blobs[0].bucket.client.batch():
+                for blob in batch_blobs:
+                    blob.delete()
+        except GoogleAPICallError:
+            # Only the last error of a batch is raised and the other
+            # deletions may have gone through, delete the rest one by one
+            for blob in batch_blobs:
+                try:
+                    blob.delete()
+                except NotFound:
+                    pass
+
+    batches = []
+    for start in range(0, len(blobs), BATCH_DELETE_SIZE):
+        end = start + BATCH_DELETE_SIZE
+        batches.append(blobs[start:end])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(delete_batch, batches))
+
+
+def verify_blob_checksums(blob, md5, crc32c):
+    """
+    Compare the checksums of an uploaded blob with the ones calculated
+    locally (md5 in hex, crc32c in base64). Returns "md5_verified" or
+    "crc32c_verified", "failed" if a checksum differs, or None if the blob
+    has no checksum to compare with.
+    """
+    if blob.md5_hash:
+        # Convert md5 from hex to base64
+        md5_base64 = base64.b64encode(bytes.fromhex(md5)).decode("utf-8")
+        if md5_base64 == blob.md5_hash:
+            return "md5_verified"
+        return "failed"
+
+    if blob.crc32c:
+        if crc32c == blob.crc32c:
+            return "crc32c_verified"
+        return "failed"
+
+    return None
+
+
+def get_committed_offset(response):
+    # A 308 response tells how many bytes the bucket has stored so far,
+    # as "Range: bytes=0-N". Without the header nothing is stored yet
+    committed_range = response.headers.get("Range")
+    if not committed_range:
+        return 0
+    return int(committed_range.split("-")[1]) + 1
+
+
+def get_resumable_upload_status(transport, session_uri, length):
+    """
+    Ask the bucket how much of a resumable upload session it has stored.
+    Returns (offset, resource), where resource is the uploaded object once
+    the upload is complete, or (None, None) if the session has expired.
+    """
+    response = transport.put(
+        session_uri, headers={"Content-Range": f"bytes */{length}"}
+    )
+    if response.status_code in (200, 201):
+        return length, response.json()
+    if response.status_code == 308:
+        return get_committed_offset(response), None
+    if response.status_code in (404, 410):
+        return None, None
+    response.raise_for_status()
+    return None, None
+
+
+def upload_to_session(transport, session_uri, stream, offset, length):
+    """
+    Send the stream, from offset, to a resumable upload session in requests
+    of STREAM_CHUNK_SIZE. Returns the resource of the uploaded object.
+    """
+    stream.seek(offset)
+    while True:
+        data = stream.read(STREAM_CHUNK_SIZE)
+        if not data:
+            offset, resource = get_resumable_upload_status(
+                transport, session_uri, length
+            )
+            if resource is None:
+                raise ValueError(f"Upload session {session_uri} is not done")
+            return resource
+
+        response = transport.put(
+            session_uri,
+            data=data,
+            headers={
+                "Content-Range": (
+                    f"bytes {offset}-{offset + len(data) - 1}/{length}"
+                )
+            },
+        )
+        if response.status_code in (200, 201):
+            return response.json()
+        if response.status_code != 308:
+            response.raise_for_status()
+            raise ValueError(
+                f"Unexpected status {response.status_code} from upload session"
+            )
+
+        # The bucket may have stored less than what we sent
+        offset = get_committed_offset(response)
+        stream.seek(offset)
+
+
+def read_range_until(stream, end):
+    # Read, without uploading, the bytes that the bucket already has, so
+    # that they are still hashed
+    stream.seek(0)
+    while stream.tell() < end:
+        if not stream.read(min(STREAM_CHUNK_SIZE, end - stream.tell())):
+            break
+
+
+def get_upload_session_blobs(bucket, blob_name):
+    # The ".partN" and ".composeL_N" blobs of a composite upload
+    temp_blob_pattern = re.compile(
+        re.escape(blob_name) + r"\.(part\d+|compose\d+_\d+)$"
+    )
+    return [
+        blob
+        for blob in bucket.list_blobs(prefix=f"{blob_name}.")
+        if temp_blob_pattern.match(blob.name)
+    ]
+
+
+def delete_upload_session_blobs(bucket, blob_name, workers=None):
+    delete_blobs(get_upload_session_blobs(bucket, blob_name), workers)
+
+
+class UploadSessionState:
+    """
+    State of a composite upload, persisted in bucket_upload_sessions: the
+    offset, length and status of every part, with the resumable session URI
+    of the parts being uploaded and the CRC32C of the ones confirmed by the
+    bucket. A task that runs again after a worker restart continues from
+    there. If the local file has changed since, the parts are discarded.
+    """
+
+    def __init__(self, bucket, blob_name, local_file_path, file_size):
+        file_mtime = int(os.path.getmtime(local_file_path))
+        upload_session = BucketUploadSession.get(bucket.name, blob_name)
+
+        if upload_session and (
+            upload_session.local_file_path != str(local_file_path)
+            or upload_session.file_size != file_size
+            or upload_session.file_mtime != file_mtime
+        ):
+            delete_upload_session_blobs(bucket, blob_name)
+            BucketUploadSession.delete(upload_session.id)
+            upload_session = None
+
+        if upload_session is None:
+            upload_session = BucketUploadSession.create(
+                bucket.name, blob_name, local_file_path, file_size, file_mtime
+            )
+        elif upload_session.parts:
+            logger.info(
+                f"Resuming upload of {blob_name} with "
+                f"{len(upload_session.parts)} parts already started"
+            )
+
+        self.id = upload_session.id
+        self.parts = dict(upload_session.parts or {})
+        self.lock = threading.Lock()
+
+    def get_part(self, part_num):
+        with self.lock:
+            return self.parts.get(str(part_num))
+
+    def set_part(self, part_num, part_state):
+        with self.lock:
+            self.parts[str(part_num)] = part_state
+            BucketUploadSession.update_parts(self.id, self.parts)
+
+    def get_planned_parts(self):
+        # Lengths of the parts recorded so far, while they follow each other
+        planned_lengths = []
+        offset = 0
+        while str(len(planned_lengths)) in self.parts:
+            part_state = self.parts[str(len(planned_lengths))]
+            if part_state["offset"] != offset:
+                break
+            planned_lengths.append(part_state["length"])
+            offset += part_state["length"]
+        return planned_lengths
+
+    def delete(self):
+        BucketUploadSession.delete(self.id)
+
+
+def parallel_composite_upload(
+    bucket,
+    local_file_path,
+    blob_name,
+    progress_callback=None,
+    workers=None,
+    digest=None,
+):
+    """
+    Upload a local file as ".partN" blobs using a bounded pool of threads
+    and compose them into blob_name.
+
+    The part size starts at INITIAL_PART_SIZE and is then tuned from the
+    measured throughput. progress_callback, if given, is called from the
+    calling thread with (bytes_uploaded, total_size) after every part.
+    digest, if given, is a StreamDigest fed with the uploaded buffers.
+
+    The parts are recorded in an UploadSessionState, so if the upload is
+    interrupted, calling this again continues from the confirmed parts
+    and from the middle of the parts that were being uploaded.
+
+    Returns the composed blob.
+    """
+    if workers is None:
+        workers = BUCKET_UPLOAD_WORKERS
+
+    total_size = os.path.getsize(local_file_path)
+    tuner = PartSizeTuner()
+    session_state = UploadSessionState(
+        bucket, blob_name, local_file_path, total_size
+    )
+    planned_lengths = session_state.get_planned_parts()
+    transport = bucket.client._http
+
+    def upload_part(part_num, offset, length):
+        temp_blob = bucket.blob(f"{blob_name}.part{part_num}")
+        part_state = session_state.get_part(part_num)
+        if part_state and (
+            part_state["offset"] != offset or part_state["length"] != length
+        ):
+            part_state = None
+
+        # Find out how much of the part the bucket already has
+        resume_offset = 0
+        resource = None
+        session_uri = None
+        if part_state and part_state["status"] == "done":
+            stored_blob = bucket.get_blob(temp_blob.name)
+            if stored_blob and stored_blob.crc32c == part_state["crc32c"]:
+                resume_offset = length
+                resource = {"crc32c": stored_blob.crc32c}
+        elif part_state and part_state["status"] == "uploading":
+            resume_offset, resource = get_resumable_upload_status(
+                transport, part_state["session_uri"], length
+            )
+            if resume_offset is None:
+                resume_offset = 0
+            else:
+                session_uri = part_state["session_uri"]
+
+        # Stream the part from disk instead of reading it into memory
+        with FileRange(local_file_path, offset, length, digest) as part_stream:
+            if resume_offset:
+                read_range_until(part_stream, resume_offset)
+
+            part_crc32c = crc32c_to_int(part_stream.crc32c)
+            if resource and crc32c_to_int(resource["crc32c"]) != (part_crc32c):
+                # What the bucket has is not this part, send it again
+                resume_offset = 0
+                resource = None
+                session_uri = None
+
+            if resource is None:
+                if session_uri is None:
+                    session_uri = temp_blob.create_resumable_upload_session(
+                        content_type="application/octet-stream", size=length
+                    )
+                    session_state.set_part(
+                        part_num,
+                        {
+                            "status": "uploading",
+                            "offset": offset,
+                            "length": length,
+                            "session_uri": session_uri,
+                        },
+                    )
+                started = time.monotonic()
+                resource = upload_to_session(
+                    transport, session_uri, part_stream, resume_offset, length
+                )
+                tuner.record(
+                    length - resume_offset, time.monotonic() - started
+                )
+                part_stream.seek(length)
+                part_crc32c = crc32c_to_int(part_stream.crc32c)
+
+        if crc32c_to_int(resource["crc32c"]) != part_crc32c:
+            raise ValueError(
+                f"CRC32C checksum of part {part_num} does not match!"
+            )
+
+        session_state.set_part(
+            part_num,
+            {
+                "status": "done",
+                "offset": offset,
+                "length": length,
+                "crc32c": crc32c_to_base64(part_crc32c),
+            },
+        )
+        return temp_blob, part_crc32c
+
+    part_blobs = {}
+    part_crc32cs = {}
+    bytes_uploaded = 0
+    next_offset = 0
+    next_part_num = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+        try:
+            while next_offset < total_size or in_flight:
+                # Only queue a few parts ahead of the workers, so that the
+                # size of the later parts follows the measured throughput
+                while next_offset < total_size and len(in_flight) < (
+                    workers * 2
+                ):
+                    if next_part_num < len(planned_lengths):
+                        length = planned_lengths[next_part_num]
+                    else:
+                        length = tuner.part_size
+                    length = min(length, total_size - next_offset)
+                    # A part that is retried continues from what the bucket
+                    # has of it
+                    future = executor.submit(
+                        retry_with_backoff,
+                        upload_part,
+                        next_part_num,
+                        next_offset,
+                        length,
+                    )
+                    in_flight[future] = (next_part_num, length)
+                    next_offset += length
+                    next_part_num += 1
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    part_num, length = in_flight.pop(future)
+                    part_blobs[part_num], part_crc32c = future.result()
+                    part_crc32cs[part_num] = (part_crc32c, length)
+                    bytes_uploaded += length
+
+                    if progress_callback:
+                        progress_callback(bytes_uploaded, total_size)
+                    print(
+                        f"Bytes uploaded: {bytes_uploaded} / {total_size}",
+                        flush=True,
+                    )
+        except Exception:
+            # Drop the parts that have not started and release the threads
+            # waiting on the digest before leaving the pool. The parts that
+            # were uploaded stay in the bucket for the next attempt
+            for future in in_flight:
+                future.cancel()
+            if digest is not None:
+                digest.abort()
+            raise
+
+    ordered_parts = [part_blobs[num] for num in sorted(part_blobs)]
+    blob, intermediate_blobs = compose_blob_parts(
+        bucket, blob_name, ordered_parts, workers
+    )
+
+    delete_blobs(ordered_parts + intermediate_blobs, workers)
+    session_state.delete()
+
+    # Composite objects have no MD5, so check that the crc32c of the
+    # composed blob is the combination of the crc32c of the parts
+    combined_crc32c = 0
+    for part_num in sorted(part_crc32cs):
+        part_crc32c, length = part_crc32cs[part_num]
+        combined_crc32c = crc32c_combine(combined_crc32c, part_crc32c, length)
+    if blob.crc32c and crc32c_to_int(blob.crc32c) != combined_crc32c:
+        raise ValueError("CRC32C checksum of composed blob does not match!")
+
+    return blob
+
+
 def bucket_chunked_upload(
     local_file_path,
     destination_upload_directory,
@@ -103,88 +1148,170 @@ def bucket_chunked_upload(
 
     bucket_name = bucket_name.lower()
 
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
     bucket = storage_client.bucket(bucket_name)
 
     total_size = os.path.getsize(local_file_path)
     # If the file is smaller than 30 MB, upload it directly
-    if total_size <= 30 * 1024 * 1024:
+    if total_size <= DIRECT_UPLOAD_MAX_SIZE:
         blob = bucket.blob(
-            f"{destination_upload_directory}/{destination_blob_name}"
+            f"{destination_upload_directory}/{destination_blob_name}",
+            chunk_size=STREAM_CHUNK_SIZE,
         )
-        blob.upload_from_filename(local_file_path)
+        retry_with_backoff(blob.upload_from_filename, local_file_path)
+        index_blob(bucket_name, blob)
         if process_id:
             update_progress_db(
                 process_id, upload_type, 100, destination_blob_name
             )
         return True
 
-    # If the file is between 30 MB and 700 MB, do chunks of 30 MB each
-    if 30 * 1024 * 1024 < total_size <= 700 * 1024 * 1024:
-        chunk_size = 30 * 1024 * 1024
+    def report_progress(bytes_uploaded, total_size):
+        if process_id:
+            update_progress_db(
+                process_id,
+                upload_type,
+                (bytes_uploaded / total_size) * 100,
+                destination_blob_name,
+            )
 
-    # If the file is larger than 700 MB, separate it into 32 chunks
-    else:
-        chunk_size = total_size // 30
+    # Otherwise upload it in parts, in parallel, and compose them
+    blob = parallel_composite_upload(
+        bucket,
+        local_file_path,
+        f"{destination_upload_directory}/{destination_blob_name}",
+        progress_callback=report_progress,
+    )
+    index_blob(bucket_name, blob)
 
-    chunk_num = 0
-    chunks = []
+    if process_id:
+        update_progress_db(process_id, upload_type, 100, destination_blob_name)
+    return True
 
-    with open(local_file_path, "rb") as file:
-        while True:
-            data = file.read(chunk_size)
-            if not data:
-                break
 
-            temp_blob = bucket.blob(
-                f"{destination_upload_directory}/"
-                f"{destination_blob_name}.part{chunk_num}"
-            )
-            temp_blob.upload_from_string(
-                data, content_type="application/octet-stream"
-            )
-            chunks.append(temp_blob)
-            chunk_num += 1
+def sync_folder_to_bucket(
+    folder_path,
+    destination_upload_directory,
+    bucket_name,
+    upload_file,
+    delete_strays=False,
+    workers=None,
+    file_names=None,
+):
+    """
+    Make destination_upload_directory of the bucket match folder_path, like
+    rsync. Every file is compared with the blob of the same name, by size
+    and then by checksum, and only the new or changed ones are uploaded,
+    several at a time, with upload_file(file_path, destination_blob_name,
+    digests). digests are the LocalFileDigests of the file, so that a
+    checksum computed for the comparison is not computed again.
+    With delete_strays, the blobs of the directory that have no local file
+    any more are deleted. Returns the number of files uploaded, unchanged
+    and deleted.
+
+    A file that fails does not stop the others. The failures are raised
+    together as a BucketTransferError once the others are done, and can
+    be retried alone by passing their names as file_names.
+    """
+    if workers is None:
+        workers = BUCKET_SYNC_WORKERS
 
-            if process_id:
-                update_progress_db(
-                    process_id,
-                    upload_type,
-                    (file.tell() / total_size) * 100,
-                    destination_blob_name,
-                )
-            print(f"Bytes uploaded: {file.tell()} / {total_size}", flush=True)
+    bucket_name = bucket_name.lower()
+    bucket = get_storage_client().bucket(bucket_name)
 
-        blob = bucket.blob(
-            f"{destination_upload_directory}/{destination_blob_name}"
-        )
-        blob.compose(chunks)
+    local_files = {}
+    for root, _, files in os.walk(folder_path):
+        for file_name in files:
+            file_path = os.path.join(root, file_name)
+            local_files[os.path.relpath(file_path, folder_path)] = file_path
 
-        for temp_blob in chunks:
-            temp_blob.delete()
+    # A single listing of the directory gives the size and checksums
+    prefix = get_blob_name(destination_upload_directory, "")
+    remote_blobs = {
+        blob.name.removeprefix(prefix): blob
+        for blob in bucket.list_blobs(prefix=prefix)
+    }
 
-        if process_id:
-            update_progress_db(
-                process_id, upload_type, 100, destination_blob_name
-            )
+    def sync_file(destination_blob_name):
+        file_path = local_files[destination_blob_name]
+        blob = remote_blobs.get(destination_blob_name)
+        digests = LocalFileDigests(file_path)
+        if blob is not None and digests.matches(
+            blob, os.path.getsize(file_path)
+        ):
+            return False
+        upload_file(file_path, destination_blob_name, digests)
         return True
 
+    if file_names is None:
+        file_names = list(local_files)
+    file_names = [name for name in file_names if name in local_files]
+
+    uploaded = 0
+    failed = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(sync_file, name): name for name in file_names
+        }
+        for future, name in futures.items():
+            try:
+                uploaded += future.result()
+            except Exception as e:
+                logger.error(f"Could not sync {name} to {prefix}: {e}")
+                failed[name] = e
+
+    if failed:
+        raise BucketTransferError(failed)
+
+    deleted = 0
+    if delete_strays:
+        strays = [
+            blob
+            for name, blob in remote_blobs.items()
+            if name not in local_files
+        ]
+        delete_blobs(strays)
+        BucketObject.delete_names(bucket_name, [blob.name for blob in strays])
+        deleted = len(strays)
+
+    unchanged = len(file_names) - uploaded
+    logger.info(
+        f"Synced {folder_path} to {prefix} of bucket {bucket_name}: "
+        f"{uploaded} uploaded, {unchanged} unchanged, {deleted} deleted"
+    )
+    return uploaded, unchanged, deleted
+
 
 def bucket_upload_folder(
-    folder_path, destination_upload_directory, process_id, upload_type, bucket
+    folder_path,
+    destination_upload_directory,
+    process_id,
+    upload_type,
+    bucket,
+    delete_strays=False,
+    file_names=None,
 ):
-    for root, _, files in os.walk(folder_path):
-        for file_name in files:
-            file_path = os.path.join(root, file_name)
-            destination_blob_name = os.path.relpath(file_path, folder_path)
-            bucket_chunked_upload(
-                file_path,
-                destination_upload_directory,
-                destination_blob_name,
-                process_id,
-                upload_type,
-                bucket,
-            )
+    if bucket is None:
+        bucket = os.environ.get("GOOGLE_STORAGE_BUCKET_NAME")
+
+    def upload_file(file_path, destination_blob_name, digests):
+        bucket_chunked_upload(
+            file_path,
+            destination_upload_directory,
+            destination_blob_name,
+            process_id,
+            upload_type,
+            bucket,
+        )
+
+    return sync_folder_to_bucket(
+        folder_path,
+        destination_upload_directory,
+        bucket,
+        upload_file,
+        delete_strays=delete_strays,
+        file_names=file_names,
+    )
 
 
 def init_upload_final_files_to_storage(process_id):
@@ -210,7 +1337,13 @@ def init_upload_final_files_to_storage(process_id):
     return {"msg": "Process initiated"}
 
 
-def upload_final_files_to_storage(process_id):
+def upload_final_files_to_storage(process_id, resume=False):
+    """
+    Upload the renamed files of the process, and its metadata file, to
+    their buckets. A file that fails does not stop the others, the
+    failures are raised together as a BucketTransferError at the end. With
+    resume, the files already marked as uploaded are skipped.
+    """
     upload = Upload.get(process_id)
     sequencing_method = upload.sequencing_method
     uploads_folder = upload.uploads_folder
@@ -220,6 +1353,7 @@ def upload_final_files_to_storage(process_id):
 
     first_bucket = None
     first_folder = None
+    failed = {}
 
     # lets iterate it doing the actual move
     for key, value in files_json.items():
@@ -250,15 +1384,24 @@ def upload_final_files_to_storage(process_id):
                 first_bucket = bucket
                 first_folder = folder
 
+            if resume and value.get("uploaded") == "Done":
+                files_done = files_done + 1
+                continue
+
             new_file_path = os.path.join(extract_directory, file_to_move)
-            bucket_chunked_upload(
-                new_file_path,
-                folder,
-                file_to_move,
-                process_id,
-                "renamed_files",
-                bucket,
-            )
+            try:
+                bucket_chunked_upload(
+                    new_file_path,
+                    folder,
+                    file_to_move,
+                    process_id,
+                    "renamed_files",
+                    bucket,
+                )
+            except Exception as e:
+                logger.error(f"Could not upload {file_to_move}: {e}")
+                failed[file_to_move] = e
+                continue
             files_json[key]["uploaded"] = "Done"
 
             files_done = files_done + 1
@@ -282,6 +1425,9 @@ def upload_final_files_to_storage(process_id):
             first_bucket,
         )
 
+    if failed:
+        raise BucketTransferError(failed)
+
     Upload.mark_field_as_true(process_id, "renamed_sent_to_bucket")
 
     return "ok"
@@ -312,6 +1458,14 @@ def get_renamed_files_to_storage_progress(process_id):
 
 
 def get_project_resource_role_users(role):
+    return get_cached(
+        f"registry:project_role_users:{role}",
+        REGISTRY_CACHE_TTL,
+        lambda: fetch_project_resource_role_users(role),
+    )
+
+
+def fetch_project_resource_role_users(role):
     from google.auth import default
     from googleapiclient import discovery
 
@@ -342,13 +1496,15 @@ def get_project_resource_role_users(role):
 
 
 def get_bucket_role_users(bucket_name, role):
-    from google.auth import default
+    return get_cached(
+        f"registry:bucket_role_users:{bucket_name}:{role}",
+        REGISTRY_CACHE_TTL,
+        lambda: fetch_bucket_role_users(bucket_name, role),
+    )
 
-    # Authenticate with Google Cloud
-    credentials, _ = default()
 
-    # Create a storage client
-    storage_client = storage.Client(credentials=credentials)
+def fetch_bucket_role_users(bucket_name, role):
+    storage_client = get_storage_client()
 
     # Retrieve the IAM policy for the bucket
     bucket = storage_client.get_bucket(bucket_name)
@@ -377,100 +1533,491 @@ def get_bucket_role_users(bucket_name, role):
 
 
 def get_bucket_size_excluding_archive(bucket_name):
-    # Initialize Google Cloud Storage client
-    client = storage.Client()
-    bucket = client.bucket(bucket_name)
+    # Calculate total size excluding blobs in the "archive" folder, from the
+    # bucket objects index
+    ensure_bucket_objects_indexed(bucket_name)
+    return BucketObject.get_total_size(bucket_name, exclude_prefix="archive/")
+
+
+def read_blob_range(bucket, bucket_object, start, end):
+    # Bytes [start, end) of the object. The generation, when known, makes
+    # all the ranges come from the same version of the object
+    if start == end:
+        return b""
+    blob = bucket.blob(bucket_object.name, generation=bucket_object.generation)
+    return blob.download_as_bytes(start=start, end=end - 1, checksum=None)
+
+
+def read_blob_ranges(bucket, bucket_objects, workers=None):
+    """
+    Download the objects in ranges of STREAM_CHUNK_SIZE with a pool of
+    threads and yield (bucket_object, data) in order. At most workers * 2
+    ranges are held in memory, whatever the size of the objects. Empty
+    objects yield a single empty range.
+
+    The CRC32C of every object is checked as its ranges go by, and the
+    last range of an object is only yielded if it matches.
+    """
+    if workers is None:
+        workers = BUCKET_UPLOAD_WORKERS
+
+    def get_ranges():
+        for bucket_object in bucket_objects:
+            size = bucket_object.size or 0
+            # The first range is empty for empty objects
+            for start in range(0, max(size, 1), STREAM_CHUNK_SIZE):
+                yield bucket_object, start, min(
+                    start + STREAM_CHUNK_SIZE, size
+                )
+
+    checksum = None
+
+    def verify_range(bucket_object, start, end, data):
+        nonlocal checksum
+        if start == 0:
+            checksum = google_crc32c.Checksum()
+        checksum.update(data)
+        if end >= (bucket_object.size or 0) and bucket_object.crc32c:
+            if crc32c_to_int(checksum) != crc32c_to_int(bucket_object.crc32c):
+                raise ValueError(
+                    f"CRC32C checksum of {bucket_object.name} does not match!"
+                )
+        return bucket_object, data
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for bucket_object, start, end in get_ranges():
+                pending.append(
+                    (
+                        bucket_object,
+                        start,
+                        end,
+                        executor.submit(
+                            read_blob_range, bucket, bucket_object, start, end
+                        ),
+                    )
+                )
+                if len(pending) >= workers * 2:
+                    bucket_object, start, end, future = pending.popleft()
+                    yield verify_range(
+                        bucket_object, start, end, future.result()
+                    )
+
+            while pending:
+                bucket_object, start, end, future = pending.popleft()
+                yield verify_range(bucket_object, start, end, future.result())
+        finally:
+            for _, _, _, future in pending:
+                future.cancel()
+
+
+def download_blob_to_file(bucket, bucket_object, file_path, workers=None):
+    """
+    Download an object to a local file in ranges of STREAM_CHUNK_SIZE,
+    fetched by a pool of threads and written in place with os.pwrite into
+    the preallocated file, so the ranges do not wait for each other. The
+    CRC32C of the ranges are combined and checked against the one of the
+    object, and the file is removed if it does not match.
+    """
+    if workers is None:
+        workers = BUCKET_UPLOAD_WORKERS
+
+    size = bucket_object.size or 0
+    fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+    def download_range(start):
+        end = min(start + STREAM_CHUNK_SIZE, size)
+        data = read_blob_range(bucket, bucket_object, start, end)
+        if len(data) != end - start:
+            raise ValueError(
+                f"Range {start}-{end} of {bucket_object.name} is incomplete"
+            )
+        view = memoryview(data)
+        written = 0
+        while written < len(data):
+            written += os.pwrite(fd, view[written:], start + written)
+        return google_crc32c.value(data), len(data)
+
+    try:
+        if size:
+            try:
+                # Reserve the blocks now rather than as the ranges land
+                os.posix_fallocate(fd, 0, size)
+            except (AttributeError, OSError):
+                os.ftruncate(fd, size)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            range_crc32cs = list(
+                executor.map(download_range, range(0, size, STREAM_CHUNK_SIZE))
+            )
+
+        combined_crc32c = 0
+        for range_crc32c, length in range_crc32cs:
+            combined_crc32c = crc32c_combine(
+                combined_crc32c, range_crc32c, length
+            )
+        if bucket_object.crc32c and combined_crc32c != crc32c_to_int(
+            bucket_object.crc32c
+        ):
+            raise ValueError(
+                f"CRC32C checksum of {bucket_object.name} does not match!"
+            )
+    except Exception:
+        os.close(fd)
+        os.remove(file_path)
+        raise
+
+    os.close(fd)
+    return file_path
+
+
+class ArchiveStream(io.RawIOBase):
+    """
+    Unseekable stream that forwards what is written to target, which can
+    be switched between writes, and counts positions from offset. zipfile
+    writes to it the members of an archive that come after the ones of
+    previous segments, then its central directory into a blob of its own.
+    """
+
+    def __init__(self, offset=0, target=None):
+        self.position = offset
+        self.target = target
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.target.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+
+def zip_info_to_dict(zinfo):
+    # The fields of a zip entry needed to list it in a central directory
+    return {
+        "header_offset": zinfo.header_offset,
+        "CRC": zinfo.CRC,
+        "compress_size": zinfo.compress_size,
+        "file_size": zinfo.file_size,
+        "date_time": list(zinfo.date_time),
+        "flag_bits": zinfo.flag_bits,
+        "compress_type": zinfo.compress_type,
+        "create_version": zinfo.create_version,
+        "extract_version": zinfo.extract_version,
+        "create_system": zinfo.create_system,
+        "external_attr": zinfo.external_attr,
+    }
+
+
+def zip_info_from_dict(name, fields):
+    zinfo = zipfile.ZipInfo(name, date_time=tuple(fields["date_time"]))
+    for key, value in fields.items():
+        if key != "date_time":
+            setattr(zinfo, key, value)
+    return zinfo
+
+
+def get_reusable_archive_members(bucket_name, manifest, bucket_objects):
+    """
+    Return the segments of the last archive of the bucket, and its members
+    whose object has not changed since, or nothing if the next archive
+    should be built from scratch.
+    """
+    if manifest is None:
+        return [], {}
+
+    segments = list(manifest.segments)
+    stored_segments = {
+        bucket_object.name
+        for bucket_object in BucketObject.get_all(
+            bucket_name, prefix=ARCHIVE_SEGMENTS_PREFIX
+        )
+    }
+    # The segments, a new one and the central directory are composed
+    if len(segments) > COMPOSE_MAX_COMPONENTS - 2 or any(
+        segment["name"] not in stored_segments for segment in segments
+    ):
+        return [], {}
+
+    bucket_objects = {
+        bucket_object.name: bucket_object for bucket_object in bucket_objects
+    }
+    reused_members = {}
+    for name, member in manifest.members.items():
+        bucket_object = bucket_objects.get(name)
+        if bucket_object and (
+            member["generation"],
+            member["size"],
+            member["md5_hash"],
+            member["crc32c"],
+        ) == (
+            bucket_object.generation,
+            bucket_object.size,
+            bucket_object.md5_hash,
+            bucket_object.crc32c,
+        ):
+            reused_members[name] = member
+
+    # Members of deleted or changed objects stay in the segments, start
+    # over when they take most of the space
+    reused_bytes = sum(
+        member["size"] or 0 for member in reused_members.values()
+    )
+    segments_bytes = sum(segment["size"] for segment in segments)
+    if reused_bytes < segments_bytes * ARCHIVE_MIN_REUSED_RATIO:
+        return [], {}
 
-    # Get list of all blobs in the bucket
-    blob_list = bucket.list_blobs()
+    return segments, reused_members
 
-    # Calculate total size excluding blobs in the "archive" folder
-    total_size = sum(
-        blob.size for blob in blob_list if not blob.name.startswith("archive/")
+
+def delete_archive_segments(bucket, segments):
+    delete_blobs([bucket.blob(segment["name"]) for segment in segments])
+    BucketObject.delete_names(
+        bucket.name, [segment["name"] for segment in segments]
     )
-    return total_size
+
+
+def refresh_indexed_objects(bucket_name, bucket_objects):
+    """
+    Check that the indexed objects are still in the bucket, in the indexed
+    generation, before they are read. The objects that are gone are
+    dropped from the index and skipped, and those that have been replaced
+    are indexed again and returned as they are now.
+    """
+    blobs = stat_blobs(
+        bucket_name, [bucket_object.name for bucket_object in bucket_objects]
+    )
+
+    current = []
+    gone = []
+    for bucket_object in bucket_objects:
+        blob = blobs[bucket_object.name]
+        if blob is None:
+            gone.append(bucket_object.name)
+        elif blob.generation != bucket_object.generation:
+            index_blob(bucket_name, blob)
+            current.append(BucketObject.get(bucket_name, blob.name))
+        else:
+            current.append(bucket_object)
+
+    if gone:
+        logger.warning(
+            f"Skipping {len(gone)} objects of bucket {bucket_name} that are "
+            f"no longer in it: {gone}"
+        )
+        BucketObject.delete_names(bucket_name, gone)
+
+    return current
 
 
 def download_bucket_contents(bucket_name):
-    # Initialize Google Cloud Storage client
-    client = storage.Client()
+    """
+    Archive the content of the bucket, except the "archive" folder, into
+    archive/<datetime>-<bucket>.zip.
+
+    The members of the archive are written into segment blobs, which the
+    BucketArchiveManifest of the bucket lists with the object each member
+    was made of. The next archive is composed in the bucket from these
+    segments, a new one with the objects added or changed since, and a new
+    central directory, so only what has changed is downloaded again.
+
+    The new members are downloaded concurrently and written straight into
+    a ZIP64 stream, which is uploaded as it is produced, so nothing is
+    staged on the local disk. The progress is the share of the bytes
+    archived so far.
+    """
+    client = get_storage_client()
     bucket = client.bucket(bucket_name)
+    ensure_bucket_objects_indexed(bucket_name)
+
+    # Get list of files in the bucket, excluding the "archive" folder
+    bucket_objects = [
+        bucket_object
+        for bucket_object in BucketObject.get_all(bucket_name)
+        if (not bucket_object.name.startswith("archive/"))
+        and (not bucket_object.name.endswith("/"))
+    ]
 
-    # Get list of files in the bucket
-    blob_list = bucket.list_blobs()
-
-    # Calculate total number of files for progress tracking
-    total_files = sum(1 for _ in blob_list)
+    manifest = BucketArchiveManifest.get(bucket_name)
+    segments, reused_members = get_reusable_archive_members(
+        bucket_name, manifest, bucket_objects
+    )
+    # The index may still list objects deleted since, whose reads would
+    # fail the whole archive
+    new_objects = refresh_indexed_objects(
+        bucket_name,
+        [
+            bucket_object
+            for bucket_object in bucket_objects
+            if bucket_object.name not in reused_members
+        ],
+    )
+    logger.info(
+        f"Archiving bucket {bucket_name}: {len(reused_members)} members "
+        f"reused from {len(segments)} segments, {len(new_objects)} new."
+    )
 
-    # Initialize progress counters
-    downloaded_files = 0
-    zip_progress = 0
+    # Calculate total number of bytes for progress tracking
+    total_bytes = sum(bucket_object.size or 0 for bucket_object in new_objects)
 
-    destination_folder = os.path.join("temp", bucket_name)
-    os.makedirs(destination_folder, exist_ok=True)
+    current_datetime = datetime.datetime.now()
+    zip_filename = (
+        f"{current_datetime.strftime('%Y%m%d-%H%M')}-{bucket_name}.zip"
+    )
 
-    # Create a zip file
-    current_datetime = datetime.datetime.now().strftime("%Y%m%d-%H%M")
-    zip_filename = f"{current_datetime}-{bucket_name}.zip"
-    zip_filepath = os.path.join("temp", zip_filename)
+    # Segments outlive the archive, their name must not be reused by a
+    # later archive created within the same minute
+    segment_name = (
+        f"{ARCHIVE_SEGMENTS_PREFIX}{bucket_name}-"
+        f"{current_datetime.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    )
+    segment_blob = bucket.blob(f"{segment_name}.zipseg")
+    directory_blob = bucket.blob(f"{segment_name}.directory")
+    writers = []
+
+    def open_writer(blob):
+        # The writer cannot seek, so the zip entries are written with data
+        # descriptors, and zipfile flushes it, which the upload does not need
+        writer = blob.open(
+            "wb", chunk_size=STREAM_CHUNK_SIZE, ignore_flush=True
+        )
+        writers.append((blob, writer))
+        return writer
 
-    with zipfile.ZipFile(zip_filepath, "w") as zipf:
-        # Iterate through files in the bucket
-        for blob in bucket.list_blobs():
-            # Exclude files in the "archive" folder
-            if (not blob.name.startswith("archive/")) and (
-                not blob.name.endswith("/")
-            ):
-                # Update progress for downloaded files
-                downloaded_files += 1
-                download_progress = (
-                    downloaded_files / total_files * 60
-                )  # 60% allocated for downloading
+    # The offsets of the new members follow the reused segments
+    stream = ArchiveStream(sum(segment["size"] for segment in segments))
+    segment_start = stream.tell()
 
-                Bucket.update_progress(bucket_name, download_progress)
+    bytes_archived = 0
+    progress = 0
+    entry = None
+    entry_object = None
+    new_members = []
 
-                # Create directory if it does not exist
-                local_path = os.path.join(
-                    destination_folder, os.path.dirname(blob.name)
-                )
-                os.makedirs(local_path, exist_ok=True)
-                # Download file to local computer
-                new_file_path = os.path.join(destination_folder, blob.name)
-                blob.download_to_filename(new_file_path)
-                # Add file to zip archive
-                zipf.write(
-                    os.path.join(destination_folder, blob.name),
-                    arcname=blob.name,
+    try:
+        zipf = zipfile.ZipFile(stream, "w", allowZip64=True)
+        if new_objects:
+            stream.target = open_writer(segment_blob)
+
+        for bucket_object, data in read_blob_ranges(bucket, new_objects):
+            if bucket_object is not entry_object:
+                if entry is not None:
+                    entry.close()
+
+                time_created = bucket_object.time_created or current_datetime
+                zinfo = zipfile.ZipInfo(
+                    bucket_object.name,
+                    date_time=max(
+                        time_created, datetime.datetime(1980, 1, 1)
+                    ).timetuple()[:6],
                 )
+                # With the size known in advance, zipfile decides whether
+                # the entry needs ZIP64 fields
+                zinfo.file_size = bucket_object.size or 0
+                entry = zipf.open(zinfo, "w")
+                entry_object = bucket_object
+                new_members.append((bucket_object, zinfo))
+
+            entry.write(data)
+
+            # Update progress for archived bytes, 95% allocated for them
+            bytes_archived += len(data)
+            if total_bytes and int(bytes_archived / total_bytes * 95) > (
+                progress
+            ):
+                progress = int(bytes_archived / total_bytes * 95)
+                Bucket.update_progress(bucket_name, progress)
+
+        if entry is not None:
+            entry.close()
+        if new_objects:
+            stream.target.close()
+            segments.append(
+                {
+                    "name": segment_blob.name,
+                    "size": stream.tell() - segment_start,
+                }
+            )
 
-        # Update progress for zipping
-        zip_progress = 10  # 10% allocated for zipping
-
-        # Update database with zip progress
-        Bucket.update_progress(bucket_name, 60 + zip_progress)
+        # The central directory lists the reused members before the new
+        # ones, and goes into a blob of its own
+        zipf.filelist[:0] = [
+            zip_info_from_dict(name, member["zip"])
+            for name, member in reused_members.items()
+        ]
+        stream.target = open_writer(directory_blob)
+        zipf.close()
+        stream.target.close()
+
+        # Assemble the archive in the bucket
+        archive_blob = bucket.blob(f"archive/{zip_filename}")
+        archive_blob.content_type = "application/zip"
+        archive_blob.compose(
+            [bucket.blob(segment["name"]) for segment in segments]
+            + [directory_blob]
+        )
+    except Exception:
+        # The writers would finalize whatever has been written when they
+        # are garbage collected, do it now and delete the truncated blobs
+        for blob, writer in writers:
+            try:
+                writer.close()
+                blob.delete()
+            except Exception as e:
+                logger.error(f"Could not delete {blob.name}: {e}")
+        raise
+
+    directory_blob.delete()
+
+    members = dict(reused_members)
+    for bucket_object, zinfo in new_members:
+        members[bucket_object.name] = {
+            "generation": bucket_object.generation,
+            "size": bucket_object.size,
+            "md5_hash": bucket_object.md5_hash,
+            "crc32c": bucket_object.crc32c,
+            "zip": zip_info_to_dict(zinfo),
+        }
+    BucketArchiveManifest.save(bucket_name, zip_filename, segments, members)
+
+    # Segments of the previous archive that are no longer used
+    if manifest:
+        segment_names = {segment["name"] for segment in segments}
+        delete_archive_segments(
+            bucket,
+            [
+                segment
+                for segment in manifest.segments
+                if segment["name"] not in segment_names
+            ],
+        )
 
-    # Upload zip file to the "archive" folder
-    archive_blob = bucket.blob(f"archive/{zip_filename}")
-    archive_blob.upload_from_filename(zip_filepath)
+    if new_objects:
+        segment_blob.reload()
+        index_blob(bucket_name, segment_blob)
+    archive_blob.reload()
+    index_blob(bucket_name, archive_blob)
 
     # Update progress for uploading
     Bucket.update_progress(bucket_name, 100)
     Bucket.update_archive_filename(bucket_name, zip_filename)
 
-    # Delete the local zip file after uploading
-    os.remove(zip_filepath)
-
-    # Delete all files from the destination folder
-    shutil.rmtree(destination_folder)
-
 
 def check_archive_file(bucket_name):
-    # Initialize Google Cloud Storage client
-    client = storage.Client()
-    bucket = client.bucket(bucket_name)
-
     # Get list of blob names in the "archive" directory
-    blob_names = [blob.name for blob in bucket.list_blobs(prefix="archive/")]
+    blob_names = [
+        bucket_object.name
+        for bucket_object in BucketObject.get_all(
+            bucket_name, prefix="archive/"
+        )
+    ]
 
     # Check if any blob matches the expected filename format
     for blob_name in blob_names:
@@ -482,66 +2029,160 @@ def check_archive_file(bucket_name):
     return False
 
 
+# Signed URLs are valid for this long, and handed out again until they are
+# this close to expiring
+SIGNED_URL_EXPIRATION = datetime.timedelta(hours=1)
+SIGNED_URL_MIN_VALIDITY = datetime.timedelta(minutes=15)
+
+
 def make_file_accessible(bucket_name, file_name):
-    # Initialize a client
-    storage_client = storage.Client()
+    """
+    Return a V4 signed URL to download the file, valid for at least
+    SIGNED_URL_MIN_VALIDITY.
+
+    With service account credentials, signing is a request to IAM, and the
+    archive progress is polled by every user watching it, so URLs are
+    cached in Redis by blob generation, shared by all the processes, and
+    reused until close to their expiration.
+    """
+    bucket_object = BucketObject.get(bucket_name, file_name)
+    generation = bucket_object.generation if bucket_object else None
+
+    def sign():
+        # Initialize a client
+        storage_client = get_storage_client()
+
+        # Get the bucket and file objects
+        bucket = storage_client.bucket(bucket_name)
+        blob = bucket.blob(file_name)
 
-    # Get the bucket and file objects
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(file_name)
+        # Generate the signed URL
+        return blob.generate_signed_url(
+            version="v4",
+            expiration=SIGNED_URL_EXPIRATION,  # Expiration time for the URL
+            method="GET",  # HTTP method allowed (e.g., GET, PUT, POST, etc.)
+        )
 
-    # Generate the signed URL
-    url = blob.generate_signed_url(
-        version="v4",
-        expiration=datetime.timedelta(hours=1),  # Expiration time for the URL
-        method="GET",  # HTTP method allowed (e.g., GET, PUT, POST, etc.)
+    return get_cached(
+        f"signed_urls:{bucket_name}:{generation}:{file_name}",
+        int((SIGNED_URL_EXPIRATION - SIGNED_URL_MIN_VALIDITY).total_seconds()),
+        sign,
     )
-    return url
 
 
-def delete_buckets_archive_files():
-    # Initialize Google Cloud Storage client
-    storage_client = storage.Client()
+def forget_signed_urls(bucket_name):
+    # Called when the archive of the bucket changes, from whichever process
+    # created it
+    invalidate_cached(f"signed_urls:{bucket_name}:*")
 
-    # List the buckets in the project
-    buckets = list(storage_client.list_buckets())
 
-    # Create a dictionary with bucket names as keys and their regions as values
-    # bucket_info = {bucket.name: bucket.location for bucket in buckets}
-    current_datetime = datetime.datetime.now(datetime.timezone.utc)
+def delete_buckets_archive_files(max_age_hours=24):
+    """
+    Delete the archives older than max_age_hours from every bucket, and
+    the segments of the buckets whose last archive is older than
+    ARCHIVE_SEGMENTS_MAX_AGE_DAYS. The candidates are taken from the
+    bucket objects index by creation time, and deleted in batches.
+    """
+    storage_client = get_storage_client()
 
-    for bucket in buckets:
+    # Creation times in the bucket objects index are in UTC
+    created_before = datetime.datetime.now(datetime.timezone.utc).replace(
+        tzinfo=None
+    ) - datetime.timedelta(hours=max_age_hours)
 
-        # bucket = client.bucket(bucket_name)
-        # logger.info("-Bucket we are checking: " + bucket.name)
+    # Segments expire with the manifest of their bucket, below
+    expired_objects = [
+        bucket_object
+        for bucket_object in BucketObject.get_created_before(
+            created_before, prefix="archive/"
+        )
+        if not bucket_object.name.startswith(ARCHIVE_SEGMENTS_PREFIX)
+    ]
+    delete_blobs(
+        [
+            storage_client.bucket(bucket_object.bucket).blob(
+                bucket_object.name
+            )
+            for bucket_object in expired_objects
+        ]
+    )
 
-        # Iterate through blobs in the "archive" folder
-        for blob in bucket.list_blobs(prefix="archive/"):
+    expired_by_bucket = {}
+    for bucket_object in expired_objects:
+        expired_by_bucket.setdefault(bucket_object.bucket, []).append(
+            bucket_object.name
+        )
 
-            creation_time = blob.time_created
-            logger.info(creation_time)
+    for bucket_name, blob_names in expired_by_bucket.items():
+        BucketObject.delete_names(bucket_name, blob_names)
 
-            # Calculate age of the blob in hours
-            age_seconds = (current_datetime - creation_time).total_seconds()
-            # If the blob is older than 1 days, delete it
-            logger.info("--age_seconds is ")
-            logger.info(age_seconds)
-            if age_seconds > 86400:
-                blob.delete()
+        db_bucket = Bucket.get(bucket_name)
+        if (
+            db_bucket
+            and db_bucket.archive_file
+            and any(
+                blob_name.endswith(db_bucket.archive_file)
+                for blob_name in blob_names
+            )
+        ):
+            Bucket.update_archive_filename(bucket_name, None)
+            Bucket.update_progress(bucket_name, None)
 
-                db_bucket = Bucket.get(bucket.name)
-                logger.info("---Blob name: " + blob.name)
-                logger.info(
-                    "---db_bucket archive_file : " + db_bucket.archive_file
-                )
-                if blob.name.endswith(db_bucket.archive_file):
-                    logger.info("----It ends with it!")
-                    Bucket.update_archive_filename(bucket.name, None)
-                    Bucket.update_progress(bucket.name, None)
+        for blob_name in blob_names:
+            logger.debug(f"Deleted blob '{blob_name}'.")
+        logger.info(
+            f"Deleted {len(blob_names)} blobs from the 'archive' folder "
+            f"of bucket '{bucket_name}'."
+        )
 
-                logger.info(
-                    f"Deleted blob '{blob.name}' from the 'archive' folder."
-                )
+    # Forget the segments of the last archive once it is too old for the
+    # next one to be worth building from them
+    expired_manifests = BucketArchiveManifest.get_created_before(
+        datetime.datetime.now()
+        - datetime.timedelta(days=ARCHIVE_SEGMENTS_MAX_AGE_DAYS)
+    )
+    delete_blobs(
+        [
+            storage_client.bucket(manifest.id).blob(segment["name"])
+            for manifest in expired_manifests
+            for segment in manifest.segments
+        ]
+    )
+    for manifest in expired_manifests:
+        BucketObject.delete_names(
+            manifest.id, [segment["name"] for segment in manifest.segments]
+        )
+        BucketArchiveManifest.delete(manifest.id)
+        logger.info(f"Deleted the archive segments of '{manifest.id}'.")
+
+
+def delete_abandoned_upload_parts(max_age_hours=48):
+    """
+    Garbage-collect the temporary blobs of composite uploads that have not
+    made any progress for max_age_hours, and forget their sessions.
+    """
+    storage_client = get_storage_client()
+
+    upload_sessions = BucketUploadSession.get_abandoned(max_age_hours)
+    delete_blobs(
+        [
+            blob
+            for upload_session in upload_sessions
+            for blob in get_upload_session_blobs(
+                storage_client.bucket(upload_session.bucket),
+                upload_session.blob_name,
+            )
+        ]
+    )
+
+    for upload_session in upload_sessions:
+        BucketUploadSession.delete(upload_session.id)
+
+        logger.info(
+            f"Deleted the parts of the abandoned upload of "
+            f"'{upload_session.blob_name}' "
+            f"in bucket '{upload_session.bucket}'."
+        )
 
 
 def delete_bucket_folder(folder_name, bucket_name=None):
@@ -550,15 +2191,15 @@ def delete_bucket_folder(folder_name, bucket_name=None):
         bucket_name = os.environ.get("GOOGLE_STORAGE_BUCKET_NAME")
 
     bucket_name = bucket_name.lower()
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
     bucket = storage_client.bucket(bucket_name)
 
     blobs = bucket.list_blobs(
         prefix=folder_name
     )  # List blobs within the folder
 
-    for blob in blobs:
-        blob.delete()
+    delete_blobs(blobs)
+    BucketObject.delete_prefix(bucket_name, folder_name)
 
     logger.info(
         f"Folder '{folder_name}' and its contents "
@@ -585,67 +2226,134 @@ def init_process_fastq_files():
     return {"msg": "Process initiated"}
 
 
-def process_fastq_files():
-    storage_client = storage.Client()
-    buckets = (
-        list_buckets()
-    )  # Get the dictionary of bucket names and locations
+def gzip_blob(bucket, bucket_object, compress_executor, workers=None):
+    """
+    Compress a blob into "<name>.gz" without going through the local disk.
+
+    The blob is read in ranges by read_blob_ranges and every range is
+    compressed on compress_executor as an independent gzip member. The
+    concatenated members make a standard gzip file, which is uploaded as
+    it is produced. Returns the new blob.
+    """
+    if workers is None:
+        workers = BUCKET_UPLOAD_WORKERS
+
+    new_blob = bucket.blob(bucket_object.name + ".gz")
+    writer = new_blob.open(
+        "wb",
+        chunk_size=STREAM_CHUNK_SIZE,
+        ignore_flush=True,
+        content_type="application/gzip",
+    )
+    output_crc32c = google_crc32c.Checksum()
+    pending = deque()
 
-    processed_files = []
+    def write_member(future):
+        member = future.result()
+        writer.write(member)
+        output_crc32c.update(member)
 
-    for bucket_name in buckets:
-        bucket = storage_client.bucket(bucket_name)
+    try:
+        for _, data in read_blob_ranges(bucket, [bucket_object], workers):
+            pending.append(
+                compress_executor.submit(
+                    gzip.compress, data, GZIP_COMPRESS_LEVEL
+                )
+            )
+            if len(pending) >= workers * 2:
+                write_member(pending.popleft())
 
-        blobs = bucket.list_blobs()
+        while pending:
+            write_member(pending.popleft())
 
-        for blob in blobs:
-            # Skip files inside "MultiQC_report/" directory
-            if "MultiQC_report/" in blob.name:
-                continue
+        writer.close()
+    except Exception:
+        for future in pending:
+            future.cancel()
+        # The writer would finalize whatever has been written when it is
+        # garbage collected, do it now and delete the truncated blob
+        try:
+            writer.close()
+            new_blob.delete()
+        except Exception as e:
+            logger.error(f"Could not delete {new_blob.name}: {e}")
+        raise
 
-            # Process only .fastq files (excluding .fastq.gz)
-            if blob.name.endswith(".fastq") and not blob.name.endswith(
-                ".fastq.gz"
-            ):
-                local_file_path = os.path.join("temp", blob.name)
-                local_gz_file_path = local_file_path + ".gz"
+    # Check that the bucket got the whole compressed stream
+    new_blob.reload()
+    if crc32c_to_int(new_blob.crc32c) != crc32c_to_int(output_crc32c):
+        raise ValueError(f"CRC32C checksum of {new_blob.name} does not match!")
+
+    return new_blob
 
-                # Create local directory if it doesn't exist
-                os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
 
-                # Download the .fastq file
-                blob.download_to_filename(local_file_path)
+def process_fastq_files():
+    storage_client = get_storage_client()
+    buckets = (
+        list_buckets()
+    )  # Get the dictionary of bucket names and locations
+    for bucket_name in buckets:
+        ensure_bucket_objects_indexed(bucket_name)
+
+    # Process only .fastq files (excluding .fastq.gz), and skip files
+    # inside "MultiQC_report/" directory
+    fastq_files = [
+        (bucket_name, bucket_object)
+        for bucket_name in buckets
+        for bucket_object in BucketObject.get_all(bucket_name, suffix=".fastq")
+        if "MultiQC_report/" not in bucket_object.name
+    ]
 
-                # Compress the .fastq file to .fastq.gz
-                with open(local_file_path, "rb") as f_in:
-                    with gzip.open(local_gz_file_path, "wb") as f_out:
-                        shutil.copyfileobj(f_in, f_out)
+    # The download threads are shared by the blobs compressed together
+    workers = max(2, BUCKET_UPLOAD_WORKERS // GZIP_CONCURRENT_BLOBS)
 
-                # Upload the .fastq.gz file back to the bucket
-                new_blob = bucket.blob(blob.name + ".gz")
-                new_blob.upload_from_filename(local_gz_file_path)
+    def process_fastq_file(bucket_name, bucket_object):
+        bucket = storage_client.bucket(bucket_name)
 
-                # Verify the .fastq.gz file exists in the bucket
-                if new_blob.exists():
-                    # Record the processing information
-                    processed_files.append(
-                        {
-                            "bucket": bucket_name,
-                            "original_file": blob.name,
-                            "compressed_file": new_blob.name,
-                        }
-                    )
+        # Compress the .fastq blob to .fastq.gz, from bucket to bucket
+        new_blob = gzip_blob(bucket, bucket_object, compress_executor, workers)
+        index_blob(bucket_name, new_blob)
 
-                    # Delete the original .fastq file
-                    blob.delete()
+        # Delete the original .fastq file
+        bucket.blob(bucket_object.name).delete()
+        BucketObject.delete(bucket_name, bucket_object.name)
+
+        logger.info(
+            f"Processed and compressed {bucket_object.name} "
+            f"in bucket {bucket_name}"
+        )
 
-                    # Remove local files
-                    os.remove(local_file_path)
-                    os.remove(local_gz_file_path)
+        # Record the processing information
+        return {
+            "bucket": bucket_name,
+            "original_file": bucket_object.name,
+            "compressed_file": new_blob.name,
+        }
 
-                logger.info(
-                    f"Processed and compressed {blob.name} "
-                    f"in bucket {bucket_name}"
+    processed_files = []
+    with ThreadPoolExecutor(
+        max_workers=GZIP_WORKERS
+    ) as compress_executor, ThreadPoolExecutor(
+        max_workers=GZIP_CONCURRENT_BLOBS
+    ) as executor:
+        futures = [
+            (
+                bucket_name,
+                bucket_object,
+                executor.submit(
+                    process_fastq_file, bucket_name, bucket_object
+                ),
+            )
+            for bucket_name, bucket_object in fastq_files
+        ]
+
+        for bucket_name, bucket_object, future in futures:
+            try:
+                processed_files.append(future.result())
+            except Exception as e:
+                logger.error(
+                    f"Could not compress {bucket_object.name} "
+                    f"in bucket {bucket_name}: {e}"
                 )
 
     # Write the processed file information to a CSV
@@ -693,34 +2401,168 @@ def update_sequencer_file_progress(sequencer_file_id, progress):
     session.close()
 
 
+def get_sequencer_file_digests(sequencer_file_id):
+    # MD5 and CRC32C recorded for the file, None for those not known yet
+    if not sequencer_file_id:
+        return None, None
+
+    db_engine = connect_db()
+    session = get_session(db_engine)
+
+    sequencer_file_db = (
+        session.query(
+            SequencingFilesUploadedTable.md5,
+            SequencingFilesUploadedTable.crc32c,
+        )
+        .filter_by(id=sequencer_file_id)
+        .first()
+    )
+
+    session.close()
+
+    if not sequencer_file_db:
+        return None, None
+    return sequencer_file_db.md5, sequencer_file_db.crc32c
+
+
+def update_sequencer_file_digests(sequencer_file_id, md5, crc32c):
+    db_engine = connect_db()
+    session = get_session(db_engine)
+
+    # Fetch the existing record
+    sequencer_file_db = (
+        session.query(SequencingFilesUploadedTable)
+        .filter_by(id=sequencer_file_id)
+        .first()
+    )
+
+    if not sequencer_file_db:
+        session.close()
+        return None
+
+    # Keep the md5 given at upload time, it is the one we verify against
+    if not sequencer_file_db.md5:
+        sequencer_file_db.md5 = md5
+    sequencer_file_db.crc32c = crc32c
+
+    # Commit the changes
+    session.commit()
+    session.close()
+
+
+def update_sequencer_file_verification(sequencer_file_id, status):
+    db_engine = connect_db()
+    session = get_session(db_engine)
+
+    # Fetch the existing record
+    sequencer_file_db = (
+        session.query(SequencingFilesUploadedTable)
+        .filter_by(id=sequencer_file_id)
+        .first()
+    )
+
+    if not sequencer_file_db:
+        session.close()
+        return None
+
+    sequencer_file_db.bucket_verification_status = status
+
+    # Commit the changes
+    session.commit()
+    session.close()
+
+
+def copy_blob_in_bucket(bucket, source_object, blob_name):
+    # Server-side copy, the content does not go through this machine. The
+    # generation makes the copy fail if the indexed object was replaced
+    source = bucket.blob(
+        source_object.name, generation=source_object.generation
+    )
+    blob = bucket.blob(blob_name)
+    token, _, _ = blob.rewrite(source)
+    while token is not None:
+        token, _, _ = blob.rewrite(source, token=token)
+    return blob
+
+
+def reuse_identical_blob(bucket, blob_name, total_size, digests):
+    """
+    Look for the content of a local file in the bucket before uploading it.
+    If blob_name already holds it, the upload is skipped. If another
+    indexed object of the bucket holds it, it is copied to blob_name on
+    the bucket side. Returns (blob, "skipped" or "copied"), or (None, None)
+    if the file has to be uploaded.
+    """
+    # A single metadata request for the destination
+    blob = bucket.get_blob(blob_name)
+    if blob is not None:
+        index_blob(bucket.name, blob)
+        if digests.matches(blob, total_size):
+            return blob, "skipped"
+
+    candidates = BucketObject.get_by_size(
+        bucket.name, total_size, exclude_prefix="archive/"
+    )
+    for candidate in candidates:
+        if candidate.name == blob_name or not digests.matches(
+            candidate, total_size
+        ):
+            continue
+        try:
+            blob = copy_blob_in_bucket(bucket, candidate, blob_name)
+        except NotFound:
+            # The index is behind the bucket, forget the object
+            BucketObject.delete(bucket.name, candidate.name)
+            continue
+        return blob, "copied"
+
+    return None, None
+
+
 # Quite similar to bucket_upload_folder but accomodating for a different data
 # model in version 2 of the application.
 # To keep things simple, we are redoing the function with different parameters
 # the original function can be removed when version1 will be out of commision
-def bucket_upload_folder_v2(folder_path, destination_upload_directory, bucket):
-    for root, _, files in os.walk(folder_path):
-        for file_name in files:
-            file_path = os.path.join(root, file_name)
-            destination_blob_name = os.path.relpath(file_path, folder_path)
-            bucket_chunked_upload_v2(
-                local_file_path=file_path,
-                destination_upload_directory=destination_upload_directory,
-                destination_blob_name=destination_blob_name,
-                sequencer_file_id=None,
-                bucket_name=bucket,
-                known_md5=None,
-            )
-            logger.info("Uploaded file " + file_path)
+def bucket_upload_folder_v2(
+    folder_path,
+    destination_upload_directory,
+    bucket,
+    delete_strays=False,
+    file_names=None,
+):
+    if bucket is None:
+        bucket = os.environ.get("GOOGLE_STORAGE_BUCKET_NAME")
+
+    def upload_file(file_path, destination_blob_name, digests):
+        bucket_chunked_upload_v2(
+            local_file_path=file_path,
+            destination_upload_directory=destination_upload_directory,
+            destination_blob_name=destination_blob_name,
+            sequencer_file_id=None,
+            bucket_name=bucket,
+            known_md5=None,
+            digests=digests,
+        )
+        logger.info("Uploaded file " + file_path)
+
+    return sync_folder_to_bucket(
+        folder_path,
+        destination_upload_directory,
+        bucket,
+        upload_file,
+        delete_strays=delete_strays,
+        file_names=file_names,
+    )
 
 
 def init_bucket_upload_folder_v2(
-    folder_path, destination_upload_directory, bucket
+    folder_path, destination_upload_directory, bucket, delete_strays=False
 ):
     from tasks import bucket_upload_folder_v2_async
 
     try:
         result = bucket_upload_folder_v2_async.delay(
-            folder_path, destination_upload_directory, bucket
+            folder_path, destination_upload_directory, bucket, delete_strays
         )
         logger.info(
             f"Celery bucket_upload_folder_v2_async task "
@@ -747,6 +2589,7 @@ def bucket_chunked_upload_v2(
     sequencer_file_id,
     bucket_name,
     known_md5,
+    digests=None,
 ):
 
     # Configure Google Cloud Storage
@@ -755,104 +2598,139 @@ def bucket_chunked_upload_v2(
 
     bucket_name = bucket_name.lower()
 
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
     bucket = storage_client.bucket(bucket_name)
 
     total_size = os.path.getsize(local_file_path)
+    blob_name = get_blob_name(
+        destination_upload_directory, destination_blob_name
+    )
 
-    # If the file is smaller than 30 MB, upload it directly
-    if total_size <= 30 * 1024 * 1024:
-        if destination_upload_directory:
-            blob = bucket.blob(
-                f"{destination_upload_directory}/{destination_blob_name}"
+    def report_progress(bytes_uploaded, total_size):
+        if sequencer_file_id:
+            update_sequencer_file_progress(
+                sequencer_file_id, (bytes_uploaded / total_size) * 100
             )
-        else:
-            blob = bucket.blob(f"{destination_blob_name}")
-        blob.upload_from_filename(local_file_path)
-
-        # Verify MD5 checksum
-        blob_md5 = blob.md5_hash
-
-        if known_md5:
-            # Convert known_md5 from hex to base64
-            known_md5_base64 = base64.b64encode(
-                bytes.fromhex(known_md5)
-            ).decode("utf-8")
-
-            if blob_md5:
-                # Compare base64-encoded MD5 checksums
-                if known_md5_base64 == blob_md5:
-                    if sequencer_file_id:
-                        update_sequencer_file_progress(sequencer_file_id, 100)
-                else:
-                    raise ValueError("MD5 checksum does not match!")
 
-        return True
+    # Content that is already in the bucket is not uploaded again. The
+    # digests may have been computed by the caller already, or recorded
+    # by an earlier run of this upload
+    if digests is None:
+        md5, crc32c = get_sequencer_file_digests(sequencer_file_id)
+        digests = LocalFileDigests(
+            local_file_path, md5=md5 or known_md5, crc32c=crc32c
+        )
+    blob, reused = reuse_identical_blob(bucket, blob_name, total_size, digests)
+    if blob is not None:
+        logger.info(
+            f"Upload of {blob_name} ({total_size} bytes) to bucket "
+            f"{bucket_name} {reused}, the content is already in the bucket."
+        )
+        index_blob(bucket_name, blob)
+        return finish_bucket_upload_v2(
+            blob,
+            total_size,
+            sequencer_file_id,
+            known_md5,
+            digests.md5,
+            digests.crc32c,
+            peak_rss=None,
+            reused=reused,
+        )
 
-    # If the file is between 30 MB and 700 MB, do chunks of 30 MB each
-    if 30 * 1024 * 1024 < total_size <= 700 * 1024 * 1024:
-        chunk_size = 30 * 1024 * 1024
+    # MD5 and CRC32C are computed from the buffers that are uploaded
+    digest = StreamDigest()
+
+    with PeakRssMonitor() as rss_monitor:
+        # If the file is smaller than 30 MB, upload it directly
+        if total_size <= DIRECT_UPLOAD_MAX_SIZE:
+            blob = bucket.blob(blob_name, chunk_size=STREAM_CHUNK_SIZE)
+
+            def upload_file():
+                # The digest ignores the buffers read again by a retry
+                with FileRange(
+                    local_file_path, 0, total_size, digest
+                ) as stream:
+                    blob.upload_from_file(
+                        stream,
+                        size=total_size,
+                        content_type=mimetypes.guess_type(local_file_path)[0],
+                    )
 
-    # If the file is larger than 700 MB, separate it into 32 chunks
-    else:
-        chunk_size = total_size // 30
+            retry_with_backoff(upload_file)
 
-    chunk_num = 0
-    chunks = []
+        # Otherwise stream it in parts, in parallel, and compose them
+        else:
+            blob = parallel_composite_upload(
+                bucket,
+                local_file_path,
+                blob_name,
+                progress_callback=report_progress,
+                digest=digest,
+            )
 
-    with open(local_file_path, "rb") as file:
-        while True:
-            data = file.read(chunk_size)
-            if not data:
-                break
+    logger.info(
+        f"Uploaded {blob_name} ({total_size} bytes) to bucket {bucket_name}."
+        f" Peak RSS: {rss_monitor.peak_rss} bytes, upload buffers ceiling: "
+        f"{get_upload_memory_ceiling()} bytes"
+    )
+    index_blob(bucket_name, blob)
+
+    return finish_bucket_upload_v2(
+        blob,
+        total_size,
+        sequencer_file_id,
+        known_md5,
+        digest.md5_hexdigest(),
+        digest.crc32c_base64(),
+        peak_rss=rss_monitor.peak_rss,
+    )
 
-            if destination_upload_directory:
-                temp_blob = bucket.blob(
-                    f"{destination_upload_directory}/"
-                    f"{destination_blob_name}.part{chunk_num}"
-                )
-            else:
-                temp_blob = bucket.blob(
-                    f"{destination_blob_name}.part{chunk_num}"
-                )
-            temp_blob.upload_from_string(
-                data, content_type="application/octet-stream"
-            )
-            chunks.append(temp_blob)
-            chunk_num += 1
 
-            if sequencer_file_id:
-                update_sequencer_file_progress(
-                    sequencer_file_id, (file.tell() / total_size) * 100
-                )
-            print(f"Bytes uploaded: {file.tell()} / {total_size}", flush=True)
+def finish_bucket_upload_v2(
+    blob,
+    total_size,
+    sequencer_file_id,
+    known_md5,
+    md5,
+    crc32c,
+    peak_rss,
+    reused=None,
+):
+    # Record and verify the checksums of an uploaded, skipped or copied blob
+    blob_name = blob.name
+
+    if sequencer_file_id:
+        update_sequencer_file_digests(sequencer_file_id, md5, crc32c)
+
+    if known_md5 and known_md5 != md5:
+        if sequencer_file_id:
+            update_sequencer_file_verification(sequencer_file_id, "failed")
+        raise ValueError("MD5 checksum of the local file does not match!")
+
+    # Verify the uploaded blob. Simple uploads have an MD5, composed blobs
+    # only have a CRC32C, which we compare to the one of the whole file
+    verification_status = verify_blob_checksums(blob, md5, crc32c)
+    if sequencer_file_id:
+        update_sequencer_file_verification(
+            sequencer_file_id, verification_status
+        )
 
-        if destination_upload_directory:
-            blob = bucket.blob(
-                f"{destination_upload_directory}/{destination_blob_name}"
-            )
-        else:
-            blob = bucket.blob(f"{destination_blob_name}")
-        blob.compose(chunks)
-
-        for temp_blob in chunks:
-            temp_blob.delete()
-
-        if known_md5:
-            # Verify MD5 checksum
-            blob_md5 = blob.md5_hash
-            # Convert known_md5 from hex to base64
-            known_md5_base64 = base64.b64encode(
-                bytes.fromhex(known_md5)
-            ).decode("utf-8")
-            if blob_md5:
-                if known_md5_base64 == blob_md5:
-                    if sequencer_file_id:
-                        update_sequencer_file_progress(sequencer_file_id, 100)
-                else:
-                    raise ValueError("MD5 checksum does not match!")
+    if verification_status == "failed":
+        raise ValueError(f"Checksum of {blob_name} does not match!")
 
-        return True
+    if verification_status and sequencer_file_id:
+        update_sequencer_file_progress(sequencer_file_id, 100)
+
+    return {
+        "blob_name": blob_name,
+        "size": total_size,
+        "peak_rss": peak_rss,
+        "md5": md5,
+        "crc32c": crc32c,
+        "verification_status": verification_status,
+        "reused": reused,
+    }
 
 
 def init_bucket_chunked_upload_v2(
@@ -893,53 +2771,11 @@ def init_bucket_chunked_upload_v2(
 
 
 def count_fastq_gz_files_in_buckets():
-    # Instantiate a client
-    storage_client = storage.Client()
-
-    # List the buckets in the project
-    buckets = list(storage_client.list_buckets())
-
-    result = []  # This will hold the results
-
-    # Iterate over each bucket
-    for bucket in buckets:
-        bucket_name = bucket.name
-
-        logger.info(
-            f"Checking bucket: {bucket_name}"
-        )  # Log which bucket is being checked
-
-        # List all blobs in the bucket
-        all_blobs = storage_client.list_blobs(bucket_name)
-
-        # Dictionary to hold counts by prefix
-        counts_by_prefix = {}
-
-        # Iterate over each blob
-        for blob in all_blobs:
-            # Check if the blob ends with .fastq.gz
-            if blob.name.endswith(".fastq.gz"):
-                # Extract the prefix (first-level directory)
-                prefix = "/".join(
-                    blob.name.split("/")[:-1]
-                )  # Get everything before the last slash
-
-                # Initialize count for the prefix if not already present
-                if prefix not in counts_by_prefix:
-                    counts_by_prefix[prefix] = 0
-
-                # Increment the count for this prefix
-                counts_by_prefix[prefix] += 1
-
-                logger.info(
-                    f"Found blob: {blob.name} in prefix: {prefix}"
-                )  # Log each found blob
-
-        # Add results to the final result list
-        for prefix, count in counts_by_prefix.items():
-            result.append(
-                [bucket_name, prefix, count]
-            )  # Append bucket, prefix, and count
+    # Count the .fastq.gz files of every folder (everything before the last
+    # slash) of every bucket, from the bucket objects index
+    for bucket_name in list_buckets():
+        ensure_bucket_objects_indexed(bucket_name)
+    result = BucketObject.count_by_prefix(".fastq.gz")
 
     logger.info(f"Final results: {result}")  # Log final results
     return result
@@ -958,7 +2794,7 @@ def check_file_exists_in_bucket(
     bucket_name = bucket_name.lower()
 
     # Initialize the storage client and get the bucket
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
     bucket = storage_client.bucket(bucket_name)
 
     # Construct the full blob name
@@ -971,3 +2807,42 @@ def check_file_exists_in_bucket(
     exists = blob.exists()
 
     return exists
+
+
+def stat_blobs(bucket_name, blob_names, workers=None):
+    """
+    Get the metadata of many blobs of a bucket at once, with up to
+    BUCKET_STAT_WORKERS requests in flight, so that checking them takes
+    about as long as a single request.
+
+    Returns a dict of every blob name to its blob, with size, hashes and
+    generation loaded, or to None when there is no such blob.
+    """
+    if workers is None:
+        workers = BUCKET_STAT_WORKERS
+
+    blob_names = list(dict.fromkeys(blob_names))
+    if not blob_names:
+        return {}
+
+    if bucket_name is None:
+        bucket_name = os.environ.get("GOOGLE_STORAGE_BUCKET_NAME")
+
+    storage_client = get_storage_client()
+    bucket = storage_client.bucket(bucket_name.lower())
+
+    with ThreadPoolExecutor(
+        max_workers=min(workers, len(blob_names))
+    ) as executor:
+        blobs = executor.map(bucket.get_blob, blob_names)
+        return dict(zip(blob_names, blobs))
+
+
+def check_files_exist_in_bucket(bucket_name, blob_names, workers=None):
+    # Whether each of the blob names exists in the bucket, checked at once
+    return {
+        blob_name: blob is not None
+        for blob_name, blob in stat_blobs(
+            bucket_name, blob_names, workers
+        ).items()
+    }
@@ -0,0 +1,46 @@
+import os
+import json
+import logging
+from redis import Redis, RedisError
+
+logger = logging.getLogger("my_app_logger")  # Use the same name as in app.py
+
+# Shared by the Flask and Celery processes
+REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379/0")
+
+redis_client = Redis.from_url(REDIS_URL)
+
+
+def get_cached(key, ttl, compute):
+    """
+    Return the value cached in Redis under key, or compute it and cache it
+    for ttl seconds. Values must be JSON serializable. If Redis cannot be
+    reached, the value is computed every time.
+    """
+    try:
+        cached = redis_client.get(key)
+    except RedisError as e:
+        logger.warning(f"Could not read {key} from the cache: {e}")
+        return compute()
+
+    if cached is not None:
+        return json.loads(cached)
+
+    value = compute()
+    try:
+        redis_client.set(key, json.dumps(value), ex=ttl)
+    except RedisError as e:
+        logger.warning(f"Could not write {key} to the cache: {e}")
+
+    return value
+
+
+def invalidate_cached(*patterns):
+    # Delete the cached values whose key matches one of the glob patterns
+    try:
+        for pattern in patterns:
+            keys = list(redis_client.scan_iter(match=pattern))
+            if keys:
+                redis_client.delete(*keys)
+    except RedisError as e:
+        logger.warning(f"Could not invalidate {patterns} in the cache: {e}")
@@ -0,0 +1,260 @@
+import os
+import gzip
+import datetime
+import logging
+import numpy as np
+
+logger = logging.getLogger("my_app_logger")  # Use the same name as in app.py
+
+# Decompressed bytes parsed at a time. The index arrays of a block take
+# about twenty times its size, so this bounds the memory used whatever the
+# size of the file
+FASTQ_STATS_BLOCK_SIZE = int(
+    os.environ.get("FASTQ_STATS_BLOCK_SIZE", 4 * 1024 * 1024)
+)
+# A stats task still pending after this long was lost, with its worker or
+# by the broker, and is queued again
+FASTQ_STATS_PENDING_SECONDS = int(
+    os.environ.get("FASTQ_STATS_PENDING_SECONDS", 6 * 3600)
+)
+# Quality scores are Phred+33, as written by every current Illumina machine
+PHRED_OFFSET = 33
+
+NEWLINE = ord("\n")
+CARRIAGE_RETURN = ord("\r")
+# Whether each byte value is a G or C, and an N
+IS_GC = np.zeros(256, dtype=bool)
+IS_GC[list(b"GCgc")] = True
+IS_N = np.zeros(256, dtype=bool)
+IS_N[list(b"Nn")] = True
+
+
+class FastqStats:
+    """
+    Totals of a FASTQ file, added up one block of records at a time. Every
+    block is parsed with NumPy: the newlines give the start and end of the
+    lines, and the sequence and quality bytes are counted by position
+    without going through the reads one by one.
+    """
+
+    def __init__(self):
+        self.reads = 0
+        self.bases = 0
+        self.gc_bases = 0
+        self.n_bases = 0
+        self.length_counts = np.zeros(0, dtype=np.int64)
+        self.gc_counts = np.zeros(101, dtype=np.int64)
+        self.quality_sums = np.zeros(0, dtype=np.int64)
+        self.position_counts = np.zeros(0, dtype=np.int64)
+        self.position_n_counts = np.zeros(0, dtype=np.int64)
+
+    def add_block(self, block):
+        """
+        Add the records of block, a uint8 array of complete records, each
+        line ending with a newline.
+        """
+        line_ends = np.flatnonzero(block == NEWLINE)
+        if len(line_ends) % 4:
+            raise ValueError("The FASTQ file ends with an incomplete record")
+        if not len(line_ends):
+            return
+
+        line_starts = np.empty_like(line_ends)
+        line_starts[0] = 0
+        line_starts[1:] = line_ends[:-1] + 1
+        # Lines ending with \r\n
+        line_ends = line_ends - (block[line_ends - 1] == CARRIAGE_RETURN)
+
+        if np.any(block[line_starts[0::4]] != ord("@")):
+            raise ValueError("The file is not in FASTQ format")
+
+        sequence_starts = line_starts[1::4]
+        lengths = line_ends[1::4] - sequence_starts
+        quality_starts = line_starts[3::4]
+        if np.any(line_ends[3::4] - quality_starts != lengths):
+            raise ValueError(
+                "The FASTQ file has reads whose sequence and quality have "
+                "different lengths"
+            )
+
+        # Position in its read of every base of the block, and its index in
+        # the block for the sequence and the quality lines
+        read_offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.arange(len(read_offsets)) - read_offsets
+        sequence = block[np.repeat(sequence_starts, lengths) + positions]
+        quality = block[np.repeat(quality_starts, lengths) + positions]
+
+        is_gc = IS_GC[sequence]
+        is_n = IS_N[sequence]
+
+        # GC bases of every read, from the running total at its ends
+        gc_running = np.concatenate(([0], np.cumsum(is_gc)))
+        read_ends = np.cumsum(lengths)
+        read_gc = gc_running[read_ends] - gc_running[read_ends - lengths]
+        read_gc_percent = np.divide(
+            100 * read_gc,
+            lengths,
+            out=np.zeros(len(lengths)),
+            where=lengths > 0,
+        )
+
+        max_length = int(lengths.max()) + 1
+        self.grow(max_length)
+
+        self.reads += len(lengths)
+        self.bases += len(sequence)
+        self.gc_bases += int(is_gc.sum())
+        self.n_bases += int(is_n.sum())
+        self.length_counts[:max_length] += np.bincount(
+            lengths, minlength=max_length
+        )
+        self.gc_counts += np.bincount(
+            np.rint(read_gc_percent).astype(np.int64), minlength=101
+        )
+        self.quality_sums[:max_length] += np.bincount(
+            positions,
+            weights=quality.astype(np.int64) - PHRED_OFFSET,
+            minlength=max_length,
+        ).astype(np.int64)
+        self.position_counts[:max_length] += np.bincount(
+            positions, minlength=max_length
+        )
+        self.position_n_counts[:max_length] += np.bincount(
+            positions[is_n], minlength=max_length
+        )
+
+    def grow(self, size):
+        # The arrays by length and position grow with the longest read
+        for name in (
+            "length_counts",
+            "quality_sums",
+            "position_counts",
+            "position_n_counts",
+        ):
+            array = getattr(self, name)
+            if len(array) < size:
+                setattr(
+                    self,
+                    name,
+                    np.concatenate(
+                        (array, np.zeros(size - len(array), dtype=np.int64))
+                    ),
+                )
+
+    def to_dict(self):
+        lengths = np.flatnonzero(self.length_counts)
+        covered = np.flatnonzero(self.position_counts)
+        position_counts = self.position_counts[covered]
+
+        def percent(part, whole):
+            return round(100 * part / whole, 2) if whole else None
+
+        return {
+            "reads": self.reads,
+            "bases": self.bases,
+            "min_length": int(lengths.min()) if len(lengths) else None,
+            "max_length": int(lengths.max()) if len(lengths) else None,
+            "mean_length": (
+                round(self.bases / self.reads, 2) if self.reads else None
+            ),
+            # [length, number of reads] for every length found
+            "length_distribution": [
+                [int(length), int(self.length_counts[length])]
+                for length in lengths
+            ],
+            "gc_content": percent(self.gc_bases, self.bases),
+            # Number of reads by their GC content, from 0 to 100 %
+            "gc_distribution": self.gc_counts.tolist(),
+            "n_content": percent(self.n_bases, self.bases),
+            "mean_quality": (
+                round(float(self.quality_sums.sum()) / self.bases, 2)
+                if self.bases
+                else None
+            ),
+            # By position in the read, starting at 1
+            "mean_quality_per_position": np.round(
+                self.quality_sums[covered] / position_counts, 2
+            ).tolist(),
+            "n_content_per_position": np.round(
+                100 * self.position_n_counts[covered] / position_counts, 2
+            ).tolist(),
+        }
+
+
+def compute_fastq_stats(filepath, block_size=None):
+    """
+    Read count, length distribution, GC and N content and mean quality by
+    position of a FASTQ file, compressed with gzip or not.
+
+    The file is decompressed in blocks of block_size bytes, and the records
+    left incomplete at the end of a block are carried over to the next one.
+    """
+    if block_size is None:
+        block_size = FASTQ_STATS_BLOCK_SIZE
+
+    stats = FastqStats()
+    opener = gzip.open if str(filepath).endswith(".gz") else open
+    remainder = b""
+    with opener(filepath, "rb") as f:
+        while True:
+            data = f.read(block_size)
+            if not data:
+                break
+            block = np.frombuffer(remainder + data, dtype=np.uint8)
+            line_ends = np.flatnonzero(block == NEWLINE)
+            complete_lines = len(line_ends) - len(line_ends) % 4
+            if not complete_lines:
+                remainder = block.tobytes()
+                continue
+            end = int(line_ends[complete_lines - 1]) + 1
+            stats.add_block(block[:end])
+            remainder = block[end:].tobytes()
+
+    if remainder.strip():
+        if not remainder.endswith(b"\n"):
+            remainder += b"\n"
+        stats.add_block(np.frombuffer(remainder, dtype=np.uint8))
+
+    return stats.to_dict()
+
+
+def init_update_fastq_stats(file_id):
+
+    from tasks import update_fastq_stats_async
+    from models.sequencing_files_uploaded import SequencingFileUploaded
+
+    # Marked so that the file is not queued again while the task is waiting
+    # or running
+    SequencingFileUploaded.update_field(
+        file_id, "fastq_stats_status", "Pending"
+    )
+    SequencingFileUploaded.update_field(
+        file_id, "fastq_stats_queued_at", datetime.datetime.now()
+    )
+    try:
+        result = update_fastq_stats_async.delay(file_id)
+        logger.info(
+            "Celery update_fastq_stats task called successfully! "
+            f"Task ID: {result.id}"
+        )
+    except Exception as e:
+        SequencingFileUploaded.update_field(
+            file_id, "fastq_stats_status", None
+        )
+        logger.error("This is an error message from fastq_stats.py")
+        logger.error(e)
+
+
+def is_fastq_stats_due(fastq_stats, status, queued_at):
+    # Whether the stats of a file are to be queued: they are missing, and
+    # were never queued, or their task has been pending for too long
+    if fastq_stats:
+        return False
+    if not status:
+        return True
+    if status != "Pending":
+        return False
+    lost_before = datetime.datetime.now() - datetime.timedelta(
+        seconds=FASTQ_STATS_PENDING_SECONDS
+    )
+    return queued_at is None or queued_at < lost_before
@@ -1,17 +1,84 @@
 import os
-import multiqc
+import re
+import uuid
+import shutil
+import hashlib
+import sys
+import functools
 import subprocess
 import json
 import zipfile
 import gzip
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from redis import RedisError
 from models.upload import Upload
 from helpers.bucket import bucket_upload_folder, bucket_chunked_upload
+from helpers.cache import redis_client
 
 import logging
 
 logger = logging.getLogger("my_app_logger")  # Use the same name as in app.py
 
+FASTQC_PATH = "/usr/local/bin/FastQC/fastqc"
+# Threads given to FastQC in all, each of them working on one file at a time
+FASTQC_THREADS = int(os.environ.get("FASTQC_THREADS") or os.cpu_count() or 4)
+# Files given to a single FastQC run, so that the JVM is started once for all
+# of them while the progress is still reported every few files
+FASTQC_FILES_PER_RUN = int(os.environ.get("FASTQC_FILES_PER_RUN", 8))
+# The files uploaded within this time of each other are given to a single
+# task, that creates their reports together
+FASTQC_BATCH_DELAY_SECONDS = int(
+    os.environ.get("FASTQC_BATCH_DELAY_SECONDS", 30)
+)
+# Redis list of the reports waiting for that task, and key set while the
+# task is scheduled
+FASTQC_PENDING_REPORTS_KEY = "fastqc:pending_reports"
+FASTQC_BATCH_SCHEDULED_KEY = "fastqc:batch_scheduled"
+# Reports are kept here by FastQC version and MD5 of the FASTQ file, so that
+# the same data is not analysed again when it is renamed or uploaded again
+FASTQC_CACHE_DIR = os.environ.get(
+    "FASTQC_CACHE_DIR", os.path.join("seq_processed", ".fastqc_cache")
+)
+# The reports used the longest time ago are removed beyond this size
+FASTQC_CACHE_MAX_BYTES = int(
+    os.environ.get("FASTQC_CACHE_MAX_BYTES", 10 * 1024 * 1024 * 1024)
+)
+
+# MultiQC reports of different folders built at the same time, each one by
+# a process of its own
+MULTIQC_WORKERS = int(os.environ.get("MULTIQC_WORKERS", 2))
+# Files of a folder that its MultiQC report is made from
+MULTIQC_INPUT_SUFFIXES = ("_fastqc.zip", "_mqc.json")
+
+# Decompressed bytes of a FASTQ file searched for the primers at a time
+PRIMER_COUNT_BLOCK_SIZE = 16 * 1024 * 1024
+# When set, the primers are only counted in the first reads of every file,
+# and the counts are estimated for the whole file from them
+PRIMER_COUNT_MAX_READS = int(os.environ.get("PRIMER_COUNT_MAX_READS") or 0)
+# Bases matched by each IUPAC code of the primers. Inosine (I) pairs with
+# any base
+IUPAC_BASES = {
+    "A": "A",
+    "C": "C",
+    "G": "G",
+    "T": "T",
+    "U": "T",
+    "R": "AG",
+    "Y": "CT",
+    "S": "CG",
+    "W": "AT",
+    "K": "GT",
+    "M": "AC",
+    "B": "CGT",
+    "D": "AGT",
+    "H": "ACT",
+    "V": "ACG",
+    "N": "ACGT",
+    "I": "ACGT",
+}
+IUPAC_COMPLEMENTS = str.maketrans("ACGTURYSWKMBDHVNI", "TGCAAYRSWMKVHDBNI")
+
 
 def get_multiqc_report(process_id, bucket, folder):
     upload = Upload.get(process_id)
@@ -131,7 +198,6 @@ def fastqc_multiqc_files(process_id):
     os.makedirs(output_folder, exist_ok=True)
     output_folders = {}
     nr_output_folders = 0
-    files_done = 0
 
     fastq_files = [
         f
@@ -142,6 +208,7 @@ def fastqc_multiqc_files(process_id):
         )
     ]
     nr_files = len(fastq_files)
+    reports = []
     for fastq_file in fastq_files:
         if fastq_file in new_files_json:
             bucket = new_files_json[fastq_file]["bucket"]
@@ -154,31 +221,39 @@ def fastqc_multiqc_files(process_id):
                 output_folders[bucket][folder] = True
                 nr_output_folders += 1
 
-            create_fastqc_report(fastq_file, input_folder, bucket, folder)
+            reports.append([fastq_file, input_folder, bucket, folder])
 
-            files_done += 1
-            progress = (
-                str(files_done) + " fastq files done out of " + str(nr_files)
-            )
-            if nr_files == files_done:
-                progress = progress + ". Starting creation of multiqc reports"
-            Upload.update_fastqc_files_progress(process_id, progress)
+    def report_progress(files_done, nr_reports):
+        progress = (
+            str(files_done) + " fastq files done out of " + str(nr_files)
+        )
+        if nr_reports == files_done:
+            progress = progress + ". Starting creation of multiqc reports"
+        Upload.update_fastqc_files_progress(process_id, progress)
+
+    create_fastqc_reports(reports, on_progress=report_progress)
 
     # Run the multiqc process differently for each project.
+    multiqc_folders = {
+        os.path.join(output_folder, bucket, folder): (bucket, folder)
+        for bucket, folders in output_folders.items()
+        for folder in folders
+    }
     multiqc_done = 0
-    for bucket, folders in output_folders.items():
-        for folder in folders:
-            multiqc_folder = os.path.join(output_folder, bucket, folder)
-            multiqc.run(multiqc_folder, outdir=multiqc_folder)
-            fastq_files_to_delete = [
-                f
-                for f in os.listdir(multiqc_folder)
-                if f.endswith("_fastqc.html") or f.endswith("_fastqc.zip")
-            ]
-            for file_to_delete in fastq_files_to_delete:
-                path_to_delete = os.path.join(multiqc_folder, file_to_delete)
-                os.remove(path_to_delete)
 
+    def upload_multiqc_report(multiqc_folder, status):
+        nonlocal multiqc_done
+        bucket, folder = multiqc_folders[multiqc_folder]
+        fastq_files_to_delete = [
+            f
+            for f in os.listdir(multiqc_folder)
+            if f.endswith("_fastqc.html") or f.endswith("_fastqc.zip")
+        ]
+        for file_to_delete in fastq_files_to_delete:
+            path_to_delete = os.path.join(multiqc_folder, file_to_delete)
+            os.remove(path_to_delete)
+
+        if status in ("built", "unchanged"):
             bucket_upload_folder(
                 multiqc_folder,
                 folder + "/MultiQC_report/" + uploads_folder,
@@ -187,13 +262,15 @@ def fastqc_multiqc_files(process_id):
                 bucket,
             )
 
-            multiqc_done = multiqc_done + 1
-            progress = (
-                str(multiqc_done)
-                + " multiqc reports done out of "
-                + str(nr_output_folders)
-            )
-            Upload.update_fastqc_files_progress(process_id, progress)
+        multiqc_done = multiqc_done + 1
+        progress = (
+            str(multiqc_done)
+            + " multiqc reports done out of "
+            + str(nr_output_folders)
+        )
+        Upload.update_fastqc_files_progress(process_id, progress)
+
+    build_multiqc_reports(multiqc_folders, on_done=upload_multiqc_report)
 
     Upload.mark_field_as_true(process_id, "fastqc_sent_to_bucket")
 
@@ -201,29 +278,425 @@ def fastqc_multiqc_files(process_id):
     return results
 
 
-def create_fastqc_report(fastq_file, input_folder, bucket, region):
-    output_folder = os.path.join(input_folder, "fastqc")
-    os.makedirs(output_folder, exist_ok=True)
-    input_file = os.path.join(input_folder, fastq_file)
-    output_folder_of_file = os.path.join(output_folder, bucket, region)
-    Path(output_folder_of_file).mkdir(parents=True, exist_ok=True)
-    input_file = os.path.join(input_folder, fastq_file)
-    fastqc_cmd = (
-        f"/usr/local/bin/FastQC/fastqc "
-        f"-o '{output_folder_of_file}' "
-        f"'{input_file}'"
+def get_fastqc_report_name(fastq_file):
+    # FastQC names the reports after the file without its fastq extensions
+    name = os.path.basename(fastq_file)
+    for extension in (".gz", ".bz2", ".txt", ".fastq", ".fq"):
+        name = name.removesuffix(extension)
+    return name + "_fastqc"
+
+
+def run_fastqc(input_files, output_folder, threads):
+    """
+    Run a single FastQC process on input_files, analysing up to threads of
+    them at the same time, and return whether the report of each file was
+    created.
+    """
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+    # FastQC writes over the files of previous reports, which may be linked
+    # to the cache, so they are removed first
+    for input_file in input_files:
+        for extension in (".zip", ".html"):
+            report_file = os.path.join(
+                output_folder, get_fastqc_report_name(input_file) + extension
+            )
+            if os.path.isfile(report_file):
+                os.remove(report_file)
+
+    fastqc_cmd = [
+        FASTQC_PATH,
+        "-t",
+        str(threads),
+        "-o",
+        output_folder,
+        *input_files,
+    ]
+
+    try:
+        process = subprocess.run(fastqc_cmd, capture_output=True, text=True)
+        if process.returncode != 0:
+            logger.error(
+                f"FastQC exited with {process.returncode} for "
+                f"{len(input_files)} files of {output_folder}: "
+                f"{process.stderr.strip()}"
+            )
+    except OSError as e:
+        logger.error(f"Could not run FastQC: {e}")
+
+    # FastQC goes on with the other files when one of them fails, so the
+    # reports are checked one by one
+    results = {}
+    for input_file in input_files:
+        zip_file = os.path.join(
+            output_folder, get_fastqc_report_name(input_file) + ".zip"
+        )
+        # The earlier reports were removed, so any report is a new one
+        results[input_file] = os.path.isfile(zip_file)
+        if not results[input_file]:
+            logger.error(f"FastQC did not create the report of {input_file}")
+
+    return results
+
+
+@functools.lru_cache(maxsize=None)
+def get_fastqc_version():
+    # Reports of other versions of FastQC are not reused
+    try:
+        process = subprocess.run(
+            [FASTQC_PATH, "--version"], capture_output=True, text=True
+        )
+    except OSError as e:
+        logger.warning(f"Could not get the version of FastQC: {e}")
+        return None
+
+    version = process.stdout.strip()
+    if process.returncode != 0 or not version:
+        return None
+    return re.sub(r"[^\w.-]", "_", version)
+
+
+def get_fastqc_cache_entry(input_file, md5=None):
+    # Folder of the cached report of input_file, None if it cannot be cached
+    version = get_fastqc_version()
+    if version is None:
+        return None
+
+    if not md5:
+        try:
+            with open(input_file, "rb") as f:
+                md5 = hashlib.file_digest(f, "md5").hexdigest()
+        except OSError as e:
+            logger.warning(f"Could not get the MD5 of {input_file}: {e}")
+            return None
+
+    return os.path.join(FASTQC_CACHE_DIR, version, md5)
+
+
+def link_or_copy(source, destination):
+    # Hard links share the bytes, copies are made across file systems
+    temp_destination = f"{destination}.{uuid.uuid4().hex}"
+    try:
+        os.link(source, temp_destination)
+    except OSError:
+        shutil.copyfile(source, temp_destination)
+    os.replace(temp_destination, destination)
+
+
+def rename_fastqc_report(
+    source_folder, source_name, output_folder, new_name, new_fastq_file
+):
+    """
+    Write the report called source_name in source_folder to output_folder
+    as the report called new_name of the FASTQ file new_fastq_file.
+
+    The reports name the file they were made for, in the folder of the zip,
+    in its text files and in the HTML page, so it is replaced everywhere.
+    """
+    source_zip = os.path.join(source_folder, source_name + ".zip")
+    with zipfile.ZipFile(source_zip) as zip_ref:
+        data_file = f"{source_name}/fastqc_data.txt"
+        with zip_ref.open(data_file) as f:
+            for line in f:
+                if line.startswith(b"Filename\t"):
+                    old_fastq_file = line.split(b"\t", 1)[1].strip()
+                    break
+            else:
+                raise ValueError(f"{source_zip} does not name its file")
+
+        new_fastq_file = new_fastq_file.encode()
+        temp_zip = os.path.join(
+            output_folder, f"{new_name}.zip.{uuid.uuid4().hex}"
+        )
+        with zipfile.ZipFile(temp_zip, "w") as new_zip:
+            for member in zip_ref.infolist():
+                content = zip_ref.read(member)
+                if member.filename.endswith((".txt", ".html", ".fo")):
+                    content = content.replace(old_fastq_file, new_fastq_file)
+                member.filename = new_name + member.filename.removeprefix(
+                    source_name
+                )
+                new_zip.writestr(member, content)
+        os.replace(temp_zip, os.path.join(output_folder, new_name + ".zip"))
+
+    with open(os.path.join(source_folder, source_name + ".html"), "rb") as f:
+        content = f.read().replace(old_fastq_file, new_fastq_file)
+    temp_html = os.path.join(
+        output_folder, f"{new_name}.html.{uuid.uuid4().hex}"
     )
-    subprocess.run(fastqc_cmd, shell=True, executable="/bin/bash")
+    with open(temp_html, "wb") as f:
+        f.write(content)
+    os.replace(temp_html, os.path.join(output_folder, new_name + ".html"))
+
+
+def restore_cached_fastqc_report(entry, input_file, output_folder):
+    """
+    Put the report cached in entry in output_folder as the report of
+    input_file. Returns False when there is no such report.
+    """
+    try:
+        cached_names = [
+            file_name.removesuffix(".zip")
+            for file_name in os.listdir(entry)
+            if file_name.endswith("_fastqc.zip")
+        ]
+    except FileNotFoundError:
+        return False
+    if not cached_names:
+        return False
 
+    cached_name = cached_names[0]
+    new_name = get_fastqc_report_name(input_file)
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+    try:
+        if cached_name == new_name:
+            for extension in (".zip", ".html"):
+                link_or_copy(
+                    os.path.join(entry, cached_name + extension),
+                    os.path.join(output_folder, new_name + extension),
+                )
+        else:
+            rename_fastqc_report(
+                entry,
+                cached_name,
+                output_folder,
+                new_name,
+                os.path.basename(input_file),
+            )
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        logger.warning(f"Could not use the cached report {entry}: {e}")
+        return False
+
+    # Reports are evicted by the time they were last used
+    os.utime(entry)
+    return True
 
-def init_create_fastqc_report(fastq_file, input_folder, bucket, region):
 
-    from tasks import create_fastqc_report_async
+def store_fastqc_report_in_cache(entry, input_file, output_folder):
+    if os.path.isdir(entry):
+        os.utime(entry)
+        return
 
+    name = get_fastqc_report_name(input_file)
+    # Built aside and moved in place, so that the entry is never incomplete
+    temp_entry = f"{entry}.{uuid.uuid4().hex}"
     try:
-        result = create_fastqc_report_async.delay(
-            fastq_file, input_folder, bucket, region
+        os.makedirs(temp_entry)
+        for extension in (".zip", ".html"):
+            link_or_copy(
+                os.path.join(output_folder, name + extension),
+                os.path.join(temp_entry, name + extension),
+            )
+        os.rename(temp_entry, entry)
+    except OSError as e:
+        # Most likely cached by another worker in the meantime
+        logger.info(f"Could not cache the report of {input_file}: {e}")
+        shutil.rmtree(temp_entry, ignore_errors=True)
+
+
+def evict_fastqc_cache(max_bytes=None):
+    # Remove the reports used the longest time ago, beyond max_bytes
+    if max_bytes is None:
+        max_bytes = FASTQC_CACHE_MAX_BYTES
+    if not os.path.isdir(FASTQC_CACHE_DIR):
+        return
+
+    entries = []
+    for version_entry in os.scandir(FASTQC_CACHE_DIR):
+        if not version_entry.is_dir():
+            continue
+        for entry in os.scandir(version_entry.path):
+            # Entries still being stored have a suffix
+            if not entry.is_dir() or "." in entry.name:
+                continue
+            size = sum(
+                file_entry.stat().st_size for file_entry in os.scandir(entry)
+            )
+            entries.append((entry.stat().st_mtime, size, entry.path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total_size -= size
+
+
+def run_fastqc_with_cache(input_files, output_folder, threads, md5s):
+    """
+    Take the reports of input_files from the cache, and run FastQC on the
+    others, storing their new reports in the cache. The files without an
+    MD5 in md5s are read here, threads of them at a time, so that they are
+    hashed while the other runs go on. Returns whether the report of each
+    file was created.
+    """
+
+    def get_entry(input_file):
+        return get_fastqc_cache_entry(input_file, md5s.get(input_file))
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        cache_entries = dict(
+            zip(input_files, executor.map(get_entry, input_files))
         )
+
+    results = {}
+    missing = []
+    for input_file in input_files:
+        entry = cache_entries[input_file]
+        if entry and restore_cached_fastqc_report(
+            entry, input_file, output_folder
+        ):
+            results[input_file] = True
+        else:
+            missing.append(input_file)
+
+    if missing:
+        run_results = run_fastqc(
+            missing, output_folder, min(threads, len(missing))
+        )
+        for input_file, created in run_results.items():
+            if created and cache_entries[input_file]:
+                store_fastqc_report_in_cache(
+                    cache_entries[input_file], input_file, output_folder
+                )
+        results.update(run_results)
+
+    return results
+
+
+def create_fastqc_reports(reports, on_progress=None):
+    """
+    Create the FastQC reports of reports, a list of
+    [fastq_file, input_folder, bucket, region] with the MD5 of the file as
+    an optional fifth item, in input_folder/fastqc/bucket/region.
+
+    Reports already made for the same data by the same FastQC version are
+    taken from the cache instead, under the name of the file.
+
+    The files of each output folder are split into runs of up to
+    FASTQC_FILES_PER_RUN files, and the runs share FASTQC_THREADS threads:
+    a few runs go on at the same time, each one with several threads.
+    on_progress(files_done, nr_files) is called as the runs finish.
+
+    Returns a dict of every input file path to whether its report was
+    created.
+    """
+    md5s = {}
+    files_by_folder = {}
+    for report in reports:
+        fastq_file, input_folder, bucket, region = report[:4]
+        output_folder = os.path.join(input_folder, "fastqc", bucket, region)
+        input_file = os.path.join(input_folder, fastq_file)
+        if len(report) > 4 and report[4]:
+            md5s[input_file] = report[4]
+        files_by_folder.setdefault(output_folder, []).append(input_file)
+
+    runs = []
+    for output_folder, input_files in files_by_folder.items():
+        for start in range(0, len(input_files), FASTQC_FILES_PER_RUN):
+            end = start + FASTQC_FILES_PER_RUN
+            runs.append((input_files[start:end], output_folder))
+
+    results = {}
+    if not runs:
+        return results
+
+    parallel_runs = max(
+        1, min(len(runs), FASTQC_THREADS // FASTQC_FILES_PER_RUN)
+    )
+    threads_per_run = max(1, FASTQC_THREADS // parallel_runs)
+
+    files_done = 0
+    with ThreadPoolExecutor(max_workers=parallel_runs) as executor:
+        futures = [
+            executor.submit(
+                run_fastqc_with_cache,
+                input_files,
+                output_folder,
+                min(threads_per_run, len(input_files)),
+                md5s,
+            )
+            for input_files, output_folder in runs
+        ]
+        for future in as_completed(futures):
+            run_results = future.result()
+            results.update(run_results)
+            files_done += len(run_results)
+            if on_progress:
+                on_progress(files_done, len(reports))
+
+    if get_fastqc_version() is not None:
+        evict_fastqc_cache()
+
+    return results
+
+
+def create_fastqc_report(fastq_file, input_folder, bucket, region, md5=None):
+    create_fastqc_reports([[fastq_file, input_folder, bucket, region, md5]])
+
+
+def init_create_fastqc_reports(reports):
+
+    from tasks import create_fastqc_reports_async
+
+    try:
+        result = create_fastqc_reports_async.delay(reports)
+        logger.info(
+            "Celery create_fastqc_reports task called successfully! "
+            f"Task ID: {result.id}"
+        )
+    except Exception as e:
+        logger.error("This is an error message from fastqc.py")
+        logger.error(e)
+
+
+def init_create_fastqc_report(
+    fastq_file, input_folder, bucket, region, md5=None
+):
+    """
+    Queue the FastQC report of an uploaded file. The reports queued within
+    FASTQC_BATCH_DELAY_SECONDS of the first one are gathered in Redis and
+    created by a single create_pending_fastqc_reports task. Without Redis,
+    the report gets a task of its own.
+    """
+
+    from tasks import (
+        create_fastqc_report_async,
+        create_pending_fastqc_reports_async,
+    )
+
+    report = [fastq_file, input_folder, bucket, region, md5]
+    try:
+        redis_client.rpush(FASTQC_PENDING_REPORTS_KEY, json.dumps(report))
+        # The key expires in case the task is lost, so that the next
+        # upload schedules another one
+        if redis_client.set(
+            FASTQC_BATCH_SCHEDULED_KEY,
+            1,
+            nx=True,
+            ex=10 * FASTQC_BATCH_DELAY_SECONDS,
+        ):
+            try:
+                result = create_pending_fastqc_reports_async.apply_async(
+                    countdown=FASTQC_BATCH_DELAY_SECONDS
+                )
+            except Exception:
+                redis_client.delete(FASTQC_BATCH_SCHEDULED_KEY)
+                raise
+            logger.info(
+                "Celery create_pending_fastqc_reports task called "
+                f"successfully! Task ID: {result.id}"
+            )
+        return
+    except RedisError as e:
+        logger.warning(f"Could not queue the FastQC report in Redis: {e}")
+    except Exception as e:
+        # The report stays queued for the next task
+        logger.error("This is an error message from fastqc.py")
+        logger.error(e)
+        return
+
+    try:
+        result = create_fastqc_report_async.delay(*report)
         logger.info(
             "Celery create_fastqc_report task called successfully! "
             f"Task ID: {result.id}"
@@ -233,6 +706,20 @@ def init_create_fastqc_report(fastq_file, input_folder, bucket, region):
         logger.error(e)
 
 
+def create_pending_fastqc_reports():
+    # Reports queued after the key is removed schedule the next task
+    redis_client.delete(FASTQC_BATCH_SCHEDULED_KEY)
+    pipeline = redis_client.pipeline()
+    pipeline.lrange(FASTQC_PENDING_REPORTS_KEY, 0, -1)
+    pipeline.delete(FASTQC_PENDING_REPORTS_KEY)
+    queued, _ = pipeline.execute()
+
+    reports = [json.loads(report) for report in queued]
+    if reports:
+        logger.info(f"Creating the FastQC reports of {len(reports)} files")
+        create_fastqc_reports(reports)
+
+
 def check_fastqc_report(
     filename, bucket, region, upload_folder, return_format="html"
 ):
@@ -273,6 +760,180 @@ def check_fastqc_report(
     return False
 
 
+def get_multiqc_signature_file(multiqc_folder):
+    # Kept next to the folder, which is uploaded to the bucket as it is
+    parent_folder, name = os.path.split(os.path.normpath(multiqc_folder))
+    return os.path.join(parent_folder, f".{name}.multiqc_inputs")
+
+
+def get_multiqc_inputs_signature(multiqc_folder):
+    # Changes whenever a report of the folder is added, removed or rewritten
+    digest = hashlib.sha256()
+    nr_inputs = 0
+    for entry in sorted(os.scandir(multiqc_folder), key=lambda e: e.name):
+        if entry.is_file() and entry.name.endswith(MULTIQC_INPUT_SUFFIXES):
+            stat = entry.stat()
+            digest.update(
+                f"{entry.name}\t{stat.st_size}\t{stat.st_mtime_ns}\n".encode()
+            )
+            nr_inputs += 1
+    return digest.hexdigest() if nr_inputs else None
+
+
+def run_multiqc(multiqc_folder):
+    """
+    Build the MultiQC report of multiqc_folder, unless the reports it is
+    made from are the same as for the last one.
+
+    MultiQC runs in a process of its own, so that its modules are not
+    loaded into the worker and a crash only fails this report. Returns
+    "built", "unchanged", "empty" when there is nothing to report on, or
+    "failed".
+    """
+    signature = get_multiqc_inputs_signature(multiqc_folder)
+    if signature is None:
+        return "empty"
+
+    signature_file = get_multiqc_signature_file(multiqc_folder)
+    report_file = os.path.join(multiqc_folder, "multiqc_report.html")
+    try:
+        with open(signature_file) as f:
+            if f.read() == signature and os.path.isfile(report_file):
+                return "unchanged"
+    except FileNotFoundError:
+        pass
+
+    multiqc_cmd = [
+        sys.executable,
+        "-m",
+        "multiqc",
+        "--force",
+        "--outdir",
+        multiqc_folder,
+        multiqc_folder,
+    ]
+    process = subprocess.run(multiqc_cmd, capture_output=True, text=True)
+    if process.returncode != 0:
+        logger.error(
+            f"MultiQC exited with {process.returncode} for "
+            f"{multiqc_folder}: {process.stderr.strip()}"
+        )
+        return "failed"
+
+    with open(signature_file, "w") as f:
+        f.write(signature)
+    return "built"
+
+
+def build_multiqc_reports(multiqc_folders, on_done=None, workers=None):
+    """
+    Build the MultiQC reports of multiqc_folders, up to MULTIQC_WORKERS at
+    the same time. on_done(multiqc_folder, status) is called as each one is
+    finished, with the status returned by run_multiqc.
+    """
+    if workers is None:
+        workers = MULTIQC_WORKERS
+
+    statuses = {}
+    if not multiqc_folders:
+        return statuses
+
+    with ThreadPoolExecutor(
+        max_workers=min(workers, len(multiqc_folders))
+    ) as executor:
+        futures = {
+            executor.submit(run_multiqc, multiqc_folder): multiqc_folder
+            for multiqc_folder in multiqc_folders
+        }
+        for future in as_completed(futures):
+            multiqc_folder = futures[future]
+            statuses[multiqc_folder] = future.result()
+            logger.info(
+                f"MultiQC report of {multiqc_folder}: "
+                f"{statuses[multiqc_folder]}"
+            )
+            if on_done:
+                on_done(multiqc_folder, statuses[multiqc_folder])
+
+    return statuses
+
+
+def write_multiqc_json(path, content):
+    # Only written when it changes, so that the report is not built again
+    content = json.dumps(content, indent=1, sort_keys=True)
+    try:
+        with open(path) as f:
+            if f.read() == content:
+                return
+    except FileNotFoundError:
+        pass
+
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def write_fastq_stats_for_multiqc(multiqc_folder, uploaded_files):
+    """
+    Add the stats computed for uploaded_files, dicts with new_name and
+    fastq_stats, to the MultiQC report of multiqc_folder as custom content.
+    They are shown next to the FastQC results of the same samples, or
+    instead of them for files that have no FastQC report.
+    """
+    samples = {
+        get_fastqc_report_name(file["new_name"]).removesuffix("_fastqc"): file[
+            "fastq_stats"
+        ]
+        for file in uploaded_files
+        if file.get("fastq_stats")
+    }
+    if not samples:
+        return
+
+    write_multiqc_json(
+        os.path.join(multiqc_folder, "fastq_stats_mqc.json"),
+        {
+            "id": "fastq_stats",
+            "section_name": "FASTQ stats",
+            "description": "Computed when the files were uploaded.",
+            "plot_type": "table",
+            "pconfig": {"id": "fastq_stats_table", "title": "FASTQ stats"},
+            "data": {
+                sample: {
+                    "Reads": stats["reads"],
+                    "Mean length": stats["mean_length"],
+                    "GC %": stats["gc_content"],
+                    "N %": stats["n_content"],
+                    "Mean quality": stats["mean_quality"],
+                }
+                for sample, stats in samples.items()
+            },
+        },
+    )
+    write_multiqc_json(
+        os.path.join(multiqc_folder, "fastq_quality_mqc.json"),
+        {
+            "id": "fastq_quality",
+            "section_name": "Mean quality by position",
+            "plot_type": "linegraph",
+            "pconfig": {
+                "id": "fastq_quality_plot",
+                "title": "Mean quality by position",
+                "xlab": "Position (bp)",
+                "ylab": "Mean quality",
+            },
+            "data": {
+                sample: {
+                    position: quality
+                    for position, quality in enumerate(
+                        stats["mean_quality_per_position"], start=1
+                    )
+                }
+                for sample, stats in samples.items()
+            },
+        },
+    )
+
+
 def create_multiqc_report(process_id):
     from models.sequencing_upload import SequencingUpload
 
@@ -282,11 +943,25 @@ def create_multiqc_report(process_id):
     bucket = process_data["project_id"]
 
     if process_data["regions"]:
+        uploaded_files = SequencingUpload.get_uploaded_files(process_id)
+
+        multiqc_folders = {}
         for region in process_data["regions"]:
             multiqc_folder = os.path.join(
                 "seq_processed", uploads_folder, "fastqc", bucket, region
             )
-            multiqc.run(multiqc_folder, outdir=multiqc_folder)
+            Path(multiqc_folder).mkdir(parents=True, exist_ok=True)
+            write_fastq_stats_for_multiqc(
+                multiqc_folder,
+                [file for file in uploaded_files if file["region"] == region],
+            )
+            multiqc_folders[multiqc_folder] = region
+
+        def upload_multiqc_report(multiqc_folder, status):
+            if status not in ("built", "unchanged"):
+                return
+
+            region = multiqc_folders[multiqc_folder]
             bucket_upload_directory = (
                 region + "/MultiQC_report/" + uploads_folder
             )
@@ -308,7 +983,10 @@ def create_multiqc_report(process_id):
                 process_id=None,
                 upload_type=None,
                 bucket=bucket,
+                delete_strays=True,
             )
+
+        build_multiqc_reports(multiqc_folders, on_done=upload_multiqc_report)
     else:
         logger.info("There are no regions!")
 
@@ -418,26 +1096,84 @@ def extract_total_sequences_from_fastqc_zip(abs_zip_path):
     return total_sequences
 
 
-def count_primer_occurrences(filepath, sequence):
+def reverse_complement(sequence):
+    return sequence.upper().translate(IUPAC_COMPLEMENTS)[::-1]
+
+
+def compile_primer(sequence):
     """
-    Count the occurrences of a specific primer
-    sequence in a gzipped FASTQ file.
+    Compile a primer sequence, with IUPAC codes, into a regex matching
+    every sequence it stands for and the rest of the line after it, so that
+    a read is matched once however many times it contains the primer.
+    """
+    pattern = ""
+    for base in sequence.upper():
+        if base not in IUPAC_BASES:
+            raise ValueError(f"{sequence} is not a primer sequence")
+        bases = IUPAC_BASES[base]
+        pattern += f"[{bases}]" if len(bases) > 1 else bases
+    return re.compile(pattern.encode() + rb"[^\n]*")
 
-    Parameters:
-    filepath (str): The path to the gzipped FASTQ file.
-    sequence (str): The primer sequence to search for.
 
-    Returns:
-    int: The number of occurrences of the primer sequence in the file.
+def count_primers(filepath, primers, max_reads=None, block_size=None):
     """
-    count = 0
+    Count the reads of a FASTQ file, compressed with gzip or not, whose
+    sequence contains each of primers, a dict of names to primer sequences.
 
-    try:
-        with gzip.open(filepath, "rt") as f:  # Open gzipped file in text mode
-            for line in f:
-                if sequence in line:
-                    count += 1
-    except Exception as e:
-        logger.info(f"An error occurred: {e}")
+    The file is decompressed once for all the primers, and only the
+    sequence lines of the reads are searched. With max_reads, only the
+    first max_reads reads are, which is enough to estimate the counts of a
+    large file.
+
+    Returns the counts by name, the number of reads searched and whether
+    the search stopped before the end of the file.
+    """
+    if block_size is None:
+        block_size = PRIMER_COUNT_BLOCK_SIZE
 
-    return count
+    patterns = {
+        name: compile_primer(sequence)
+        for name, sequence in primers.items()
+        if sequence
+    }
+    counts = dict.fromkeys(primers, 0)
+    reads = 0
+    truncated = False
+
+    opener = gzip.open if str(filepath).endswith(".gz") else open
+    remainder = b""
+    with opener(filepath, "rb") as f:
+        while True:
+            data = f.read(block_size)
+            lines = (remainder + data).split(b"\n")
+            if data:
+                # The last line may be cut, it is read again with the rest
+                # of its record
+                complete_lines = (len(lines) - 1) // 4 * 4
+                remainder = b"\n".join(lines[complete_lines:])
+            else:
+                complete_lines = len(lines) // 4 * 4
+
+            sequences = lines[1:complete_lines:4]
+            limit_reached = bool(
+                max_reads and reads + len(sequences) >= max_reads
+            )
+            if limit_reached:
+                if reads + len(sequences) > max_reads:
+                    truncated = True
+                elif data:
+                    # The limit falls at the end of the block, the file only
+                    # has more reads if anything but blank lines follows
+                    rest = remainder + f.read(block_size)
+                    truncated = bool(rest.strip())
+                sequences = sequences[: max_reads - reads]
+
+            text = b"\n".join(sequences).replace(b"\r", b"")
+            for name, pattern in patterns.items():
+                counts[name] += sum(1 for _ in pattern.finditer(text))
+            reads += len(sequences)
+
+            if not data or limit_reached:
+                break
+
+    return counts, reads, truncated
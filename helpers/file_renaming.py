@@ -187,6 +187,19 @@ def calculate_md5(file_path):
     return md5.hexdigest()
 
 
+def concatenate_files_with_md5(file_paths, destination_path):
+    # Join the files into destination_path and calculate the MD5 of the
+    # result from the same buffers, instead of reading it again afterwards
+    md5 = hashlib.md5()
+    with open(destination_path, "ab") as destination_file:
+        for file_path in file_paths:
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    destination_file.write(chunk)
+                    md5.update(chunk)
+    return md5.hexdigest()
+
+
 def rename_all_files(process_id):
     upload = Upload.get(process_id)
     uploads_folder = upload.uploads_folder
@@ -0,0 +1,473 @@
+import io
+import os
+import json
+import uuid
+import time
+import base64
+import hashlib
+import datetime
+import tempfile
+import contextlib
+import types
+import google_crc32c
+import requests
+from pathlib import Path
+from google.api_core.exceptions import BadRequest, NotFound
+
+# helpers/bucket.py works with the client, buckets and blobs of the
+# google.cloud.storage library. The part of their API that it uses is what
+# a storage backend has to provide:
+#
+# Client: bucket(name), get_bucket(name), list_buckets(),
+#         list_blobs(bucket_name, prefix=None), batch(), and _http, the
+#         transport that resumable upload sessions are sent to
+# Bucket: name, location, client, blob(name, chunk_size=None,
+#         generation=None), get_blob(name), list_blobs(prefix=None),
+#         get_iam_policy()
+# Blob:   name, size, md5_hash, crc32c, generation, time_created,
+#         upload_from_file(), upload_from_filename(), open("wb"),
+#         download_as_bytes(start, end), compose(), rewrite(), delete(),
+#         exists(), reload(), create_resumable_upload_session(),
+#         generate_signed_url()
+#
+# "gcs" is the library itself. "local" keeps the buckets in directories
+# under LOCAL_STORAGE_ROOT, so that the upload, archive and gzip paths can
+# be run and benchmarked without a Google Cloud project.
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "gcs")
+LOCAL_STORAGE_ROOT = os.environ.get("LOCAL_STORAGE_ROOT", "local_storage")
+# Google Cloud Storage accepts at most 32 source objects per compose request
+LOCAL_COMPOSE_MAX_COMPONENTS = 32
+LOCAL_COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def get_file_checksums(path):
+    # md5 and crc32c of a file, in base64 like the properties of the blobs
+    md5 = hashlib.md5()
+    crc32c = google_crc32c.Checksum()
+    with open(path, "rb") as file:
+        while True:
+            data = file.read(LOCAL_COPY_CHUNK_SIZE)
+            if not data:
+                break
+            md5.update(data)
+            crc32c.update(data)
+    return (
+        base64.b64encode(md5.digest()).decode("utf-8"),
+        base64.b64encode(crc32c.digest()).decode("utf-8"),
+    )
+
+
+def copy_stream(source, target, size=None):
+    copied = 0
+    while size is None or copied < size:
+        chunk_size = LOCAL_COPY_CHUNK_SIZE
+        if size is not None:
+            chunk_size = min(chunk_size, size - copied)
+        data = source.read(chunk_size)
+        if not data:
+            break
+        target.write(data)
+        copied += len(data)
+    return copied
+
+
+class LocalClient:
+    def __init__(self, root=None):
+        self.root = root or LOCAL_STORAGE_ROOT
+        os.makedirs(self.root, exist_ok=True)
+        self._http = LocalUploadTransport(self)
+
+    def bucket(self, name):
+        return LocalBucket(self, name)
+
+    def get_bucket(self, name):
+        bucket = LocalBucket(self, name)
+        if not os.path.isdir(bucket.path):
+            raise NotFound(f"Bucket {name} not found")
+        return bucket
+
+    def create_bucket(self, name):
+        bucket = LocalBucket(self, name)
+        os.makedirs(bucket.path, exist_ok=True)
+        return bucket
+
+    def list_buckets(self):
+        return [
+            LocalBucket(self, name)
+            for name in sorted(os.listdir(self.root))
+            if not name.startswith(".")
+            and os.path.isdir(os.path.join(self.root, name))
+        ]
+
+    def list_blobs(self, bucket_name, prefix=None):
+        return self.bucket(bucket_name).list_blobs(prefix=prefix)
+
+    def batch(self):
+        # Requests are not batched, they are run when they are made
+        return contextlib.nullcontext()
+
+
+class LocalBucket:
+    location = "LOCAL"
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.path = os.path.join(client.root, name)
+
+    def blob(self, name, chunk_size=None, generation=None):
+        return LocalBlob(self, name, generation)
+
+    def get_blob(self, name):
+        blob = LocalBlob(self, name)
+        try:
+            blob.reload()
+        except NotFound:
+            return None
+        return blob
+
+    def list_blobs(self, prefix=None):
+        if not os.path.isdir(self.path):
+            return []
+
+        blobs = []
+        for entry in os.scandir(self.path):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path) as file:
+                    metadata = json.load(file)
+            except FileNotFoundError:
+                # Deleted while we were listing
+                continue
+            if prefix and not metadata["name"].startswith(prefix):
+                continue
+            blob = LocalBlob(self, metadata["name"])
+            blob.load(metadata)
+            blobs.append(blob)
+
+        return sorted(blobs, key=lambda blob: blob.name)
+
+    def get_iam_policy(self):
+        return types.SimpleNamespace(bindings=[])
+
+    def make_temp_file(self):
+        os.makedirs(self.path, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        return os.fdopen(fd, "wb"), temp_path
+
+
+class LocalBlob:
+    """
+    An object of a LocalBucket. Its content is kept in a file per
+    generation and its properties in a JSON file, both named after a hash
+    of the object name, so that any name can be stored. Readers of a
+    generation that has been replaced get NotFound, as with a bucket.
+    """
+
+    def __init__(self, bucket, name, generation=None):
+        self.bucket = bucket
+        self.name = name
+        # Only this generation can be read, if given
+        self.requested_generation = generation
+        self.generation = generation
+        self.size = None
+        self.md5_hash = None
+        self.crc32c = None
+        self.time_created = None
+        self.content_type = None
+        self.component_count = None
+
+    @property
+    def client(self):
+        return self.bucket.client
+
+    @property
+    def key(self):
+        return hashlib.sha256(self.name.encode("utf-8")).hexdigest()
+
+    @property
+    def metadata_path(self):
+        return os.path.join(self.bucket.path, f"{self.key}.json")
+
+    def get_data_path(self, generation=None):
+        if generation is None:
+            generation = self.generation
+        return os.path.join(self.bucket.path, f"{self.key}.{generation}")
+
+    def load(self, metadata):
+        self.generation = metadata["generation"]
+        self.size = metadata["size"]
+        self.md5_hash = metadata["md5_hash"]
+        self.crc32c = metadata["crc32c"]
+        self.time_created = datetime.datetime.fromisoformat(
+            metadata["time_created"]
+        )
+        self.content_type = metadata["content_type"]
+        self.component_count = metadata["component_count"]
+
+    def read_metadata(self):
+        try:
+            with open(self.metadata_path) as file:
+                metadata = json.load(file)
+        except FileNotFoundError:
+            raise NotFound(f"{self.bucket.name}/{self.name} not found")
+        if self.requested_generation is not None and (
+            metadata["generation"] != self.requested_generation
+        ):
+            raise NotFound(
+                f"{self.bucket.name}/{self.name}"
+                f"#{self.requested_generation} not found"
+            )
+        return metadata
+
+    def reload(self, **kwargs):
+        self.load(self.read_metadata())
+
+    def exists(self, **kwargs):
+        try:
+            self.read_metadata()
+        except NotFound:
+            return False
+        return True
+
+    def commit(self, temp_path, content_type=None, component_count=None):
+        # Make the content of temp_path the new generation of the object
+        md5_hash, crc32c = get_file_checksums(temp_path)
+        generation = time.time_ns()
+        os.replace(temp_path, self.get_data_path(generation))
+
+        try:
+            with open(self.metadata_path) as file:
+                previous_generation = json.load(file)["generation"]
+        except FileNotFoundError:
+            previous_generation = None
+
+        metadata = {
+            "name": self.name,
+            "generation": generation,
+            "size": os.path.getsize(self.get_data_path(generation)),
+            # Composite objects have no MD5, as in a bucket
+            "md5_hash": None if component_count else md5_hash,
+            "crc32c": crc32c,
+            "time_created": datetime.datetime.now(
+                datetime.timezone.utc
+            ).isoformat(),
+            "content_type": content_type,
+            "component_count": component_count,
+        }
+        metadata_file, metadata_temp_path = self.bucket.make_temp_file()
+        with metadata_file:
+            metadata_file.write(json.dumps(metadata).encode("utf-8"))
+        os.replace(metadata_temp_path, self.metadata_path)
+
+        if previous_generation is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.get_data_path(previous_generation))
+
+        self.load(metadata)
+
+    def upload_from_file(
+        self, file_obj, size=None, content_type=None, **kwargs
+    ):
+        temp_file, temp_path = self.bucket.make_temp_file()
+        with temp_file:
+            copy_stream(file_obj, temp_file, size)
+        self.commit(temp_path, content_type)
+
+    def upload_from_filename(self, filename, content_type=None, **kwargs):
+        with open(filename, "rb") as file_obj:
+            self.upload_from_file(file_obj, content_type=content_type)
+
+    def upload_from_string(self, data, content_type=None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.upload_from_file(io.BytesIO(data), content_type=content_type)
+
+    def open(self, mode="r", content_type=None, **kwargs):
+        if mode == "wb":
+            return LocalBlobWriter(self, content_type)
+        if mode == "rb":
+            self.reload()
+            return open(self.get_data_path(), "rb")
+        raise ValueError(f"Unsupported mode {mode}")
+
+    def download_as_bytes(self, start=None, end=None, **kwargs):
+        # end is inclusive, as in the Range header
+        self.reload()
+        start = start or 0
+        length = self.size - start if end is None else end + 1 - start
+        try:
+            with open(self.get_data_path(), "rb") as file:
+                file.seek(start)
+                return file.read(length)
+        except FileNotFoundError:
+            raise NotFound(f"{self.bucket.name}/{self.name} not found")
+
+    def compose(self, sources, **kwargs):
+        if len(sources) > LOCAL_COMPOSE_MAX_COMPONENTS:
+            raise BadRequest(
+                f"At most {LOCAL_COMPOSE_MAX_COMPONENTS} objects can be "
+                f"composed at once"
+            )
+
+        component_count = 0
+        temp_file, temp_path = self.bucket.make_temp_file()
+        try:
+            with temp_file:
+                for source in sources:
+                    source.reload()
+                    with open(source.get_data_path(), "rb") as source_file:
+                        copy_stream(source_file, temp_file)
+                    component_count += source.component_count or 1
+        except Exception:
+            os.remove(temp_path)
+            raise
+        self.commit(temp_path, self.content_type, component_count)
+
+    def rewrite(self, source, token=None, **kwargs):
+        source.reload()
+        temp_file, temp_path = self.bucket.make_temp_file()
+        try:
+            with temp_file, open(source.get_data_path(), "rb") as source_file:
+                copy_stream(source_file, temp_file)
+        except FileNotFoundError:
+            os.remove(temp_path)
+            raise NotFound(f"{source.bucket.name}/{source.name} not found")
+        self.commit(temp_path, source.content_type, source.component_count)
+        # Everything is copied in a single call
+        return None, self.size, self.size
+
+    def delete(self, **kwargs):
+        metadata = self.read_metadata()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.metadata_path)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.get_data_path(metadata["generation"]))
+
+    def create_resumable_upload_session(
+        self, content_type=None, size=None, **kwargs
+    ):
+        return self.client._http.create_session(self, size, content_type)
+
+    def generate_signed_url(self, **kwargs):
+        self.reload()
+        return Path(self.get_data_path()).resolve().as_uri()
+
+
+class LocalBlobWriter(io.RawIOBase):
+    # What blob.open("wb") returns, the object is written when it is closed
+    def __init__(self, blob, content_type=None):
+        self.blob = blob
+        self.content_type = content_type
+        self.file, self.temp_path = blob.bucket.make_temp_file()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.file.write(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.file.close()
+            self.blob.commit(self.temp_path, self.content_type)
+        super().close()
+
+
+class LocalResponse:
+    def __init__(self, status_code, headers=None, resource=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.resource = resource
+
+    def json(self):
+        return self.resource
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} from the local upload session",
+                response=self,
+            )
+
+
+class LocalUploadTransport:
+    """
+    Stands for the HTTP transport of the client when it is used for
+    resumable upload sessions. The session URIs point to files under
+    <root>/.sessions, and put() answers like the JSON API does: 308 with
+    the Range stored so far, or 200 with the object once it is complete.
+    """
+
+    def __init__(self, client):
+        self.path = os.path.join(client.root, ".sessions")
+        self.client = client
+
+    def get_session_paths(self, session_uri):
+        session_id = session_uri.split(":", 1)[1]
+        return (
+            os.path.join(self.path, f"{session_id}.json"),
+            os.path.join(self.path, f"{session_id}.data"),
+        )
+
+    def create_session(self, blob, size, content_type):
+        os.makedirs(self.path, exist_ok=True)
+        session_uri = f"local-session:{uuid.uuid4().hex}"
+        metadata_path, data_path = self.get_session_paths(session_uri)
+        with open(metadata_path, "w") as file:
+            json.dump(
+                {
+                    "bucket": blob.bucket.name,
+                    "name": blob.name,
+                    "size": size,
+                    "content_type": content_type,
+                    "resource": None,
+                },
+                file,
+            )
+        open(data_path, "wb").close()
+        return session_uri
+
+    def put(self, session_uri, data=None, headers=None, **kwargs):
+        metadata_path, data_path = self.get_session_paths(session_uri)
+        try:
+            with open(metadata_path) as file:
+                session = json.load(file)
+        except FileNotFoundError:
+            return LocalResponse(404)
+
+        if session["resource"] is not None:
+            return LocalResponse(200, resource=session["resource"])
+
+        if data is not None:
+            # "bytes <first>-<last>/<total>"
+            content_range = headers["Content-Range"].split(" ", 1)[1]
+            start = int(content_range.split("-", 1)[0])
+            if start > os.path.getsize(data_path):
+                return LocalResponse(400)
+            with open(data_path, "r+b") as file:
+                file.seek(start)
+                file.write(data)
+
+        committed = os.path.getsize(data_path)
+        if committed < session["size"]:
+            headers = {}
+            if committed:
+                headers["Range"] = f"bytes=0-{committed - 1}"
+            return LocalResponse(308, headers)
+
+        blob = self.client.bucket(session["bucket"]).blob(session["name"])
+        blob.commit(data_path, session["content_type"])
+        session["resource"] = {
+            "name": blob.name,
+            "bucket": session["bucket"],
+            "size": str(blob.size),
+            "md5Hash": blob.md5_hash,
+            "crc32c": blob.crc32c,
+            "generation": str(blob.generation),
+        }
+        with open(metadata_path, "w") as file:
+            json.dump(session, file)
+        return LocalResponse(200, resource=session["resource"])
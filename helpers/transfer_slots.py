@@ -0,0 +1,229 @@
+import os
+import time
+import logging
+import threading
+from redis import RedisError
+from helpers.cache import redis_client
+
+logger = logging.getLogger("my_app_logger")  # Use the same name as in app.py
+
+# Transfers running at the same time to a single bucket, and in total
+TRANSFER_SLOTS_PER_BUCKET = int(os.environ.get("TRANSFER_SLOTS_PER_BUCKET", 4))
+TRANSFER_SLOTS_GLOBAL = int(os.environ.get("TRANSFER_SLOTS_GLOBAL", 16))
+# A slot is given back if its holder stops renewing it for this long, so
+# that a killed worker does not keep it forever
+TRANSFER_SLOT_LEASE_SECONDS = 120
+# Tasks waiting for a slot try again after this many seconds
+TRANSFER_SLOT_RETRY_SECONDS = 10
+# A waiting task keeps its place in the queue for this long after its last
+# try. When the workers are busy, a retry can start long after its
+# countdown, so this is much longer than the retry interval. A task that
+# is lost only holds one place of the queue of its bucket until then
+TRANSFER_SLOT_WAIT_LEASE_SECONDS = 900
+
+TRANSFER_SLOTS_PREFIX = "transfer-slots"
+
+# KEYS: holders, queue, waiting and ticket counter of the bucket, holders
+# of all buckets
+# ARGV: token, now, lease expiry, queue expiry, bucket limit, global limit
+#
+# The tasks waiting for a bucket are served in the order they first asked,
+# which makes the uploads of a bucket take turns. The bucket limit keeps
+# the tasks of a single bucket from taking all the global slots, so every
+# bucket with waiting tasks gets a share of them.
+ACQUIRE_SCRIPT = """
+local token = ARGV[1]
+local now = tonumber(ARGV[2])
+
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now)
+redis.call("ZREMRANGEBYSCORE", KEYS[5], "-inf", now)
+local gone = redis.call("ZRANGEBYSCORE", KEYS[3], "-inf", now)
+for _, waiter in ipairs(gone) do
+    redis.call("ZREM", KEYS[2], waiter)
+    redis.call("ZREM", KEYS[3], waiter)
+end
+
+if redis.call("ZSCORE", KEYS[1], token) then
+    redis.call("ZADD", KEYS[1], ARGV[3], token)
+    redis.call("ZADD", KEYS[5], ARGV[3], token)
+    return 1
+end
+
+if not redis.call("ZSCORE", KEYS[2], token) then
+    local ticket = redis.call("INCR", KEYS[4])
+    redis.call("ZADD", KEYS[2], ticket, token)
+end
+redis.call("ZADD", KEYS[3], ARGV[4], token)
+
+local free = tonumber(ARGV[5]) - redis.call("ZCARD", KEYS[1])
+if redis.call("ZRANK", KEYS[2], token) >= free then
+    return 0
+end
+if redis.call("ZCARD", KEYS[5]) >= tonumber(ARGV[6]) then
+    return 0
+end
+
+redis.call("ZREM", KEYS[2], token)
+redis.call("ZREM", KEYS[3], token)
+redis.call("ZADD", KEYS[1], ARGV[3], token)
+redis.call("ZADD", KEYS[5], ARGV[3], token)
+return 1
+"""
+
+# KEYS: holders of the bucket, holders of all buckets
+# ARGV: token, now, lease expiry
+#
+# Extends the lease of a slot that is still held. A slot that has expired
+# is not taken again, nor is the token put back in the queue
+RENEW_SCRIPT = """
+local token = ARGV[1]
+local holders = redis.call("ZSCORE", KEYS[1], token)
+if not holders or tonumber(holders) <= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call("ZADD", KEYS[1], ARGV[3], token)
+redis.call("ZADD", KEYS[2], ARGV[3], token)
+return 1
+"""
+
+acquire_script = redis_client.register_script(ACQUIRE_SCRIPT)
+renew_script = redis_client.register_script(RENEW_SCRIPT)
+
+
+def get_slot_keys(bucket_name):
+    prefix = f"{TRANSFER_SLOTS_PREFIX}:{bucket_name}"
+    return (
+        f"{prefix}:holders",
+        f"{prefix}:queue",
+        f"{prefix}:waiting",
+        f"{prefix}:tickets",
+        f"{TRANSFER_SLOTS_PREFIX}:global:holders",
+    )
+
+
+class TransferSlot:
+    """
+    A slot to transfer data to or from a bucket, out of
+    TRANSFER_SLOTS_PER_BUCKET for the bucket and TRANSFER_SLOTS_GLOBAL for
+    all of them, shared by every worker through Redis.
+
+    acquire() does not block: a Celery task that gets False retries later
+    with the same token, its task id, and keeps its place in the queue.
+    Once acquired, the slot is renewed in the background until the with
+    block is left. If Redis cannot be reached, transfers are not limited.
+    """
+
+    def __init__(self, bucket_name, token):
+        self.bucket_name = bucket_name.lower()
+        self.token = token
+        self.keys = get_slot_keys(self.bucket_name)
+        self.stopped = threading.Event()
+        self.renewer = None
+
+    def acquire(self):
+        now = time.time()
+        try:
+            return bool(
+                acquire_script(
+                    keys=self.keys,
+                    args=[
+                        self.token,
+                        now,
+                        now + TRANSFER_SLOT_LEASE_SECONDS,
+                        now + TRANSFER_SLOT_WAIT_LEASE_SECONDS,
+                        TRANSFER_SLOTS_PER_BUCKET,
+                        TRANSFER_SLOTS_GLOBAL,
+                    ],
+                )
+            )
+        except RedisError as e:
+            logger.warning(
+                f"Could not get a transfer slot for {self.bucket_name}: {e}"
+            )
+            return True
+
+    def renew(self):
+        while not self.stopped.wait(TRANSFER_SLOT_LEASE_SECONDS / 3):
+            now = time.time()
+            try:
+                renewed = renew_script(
+                    keys=[self.keys[0], self.keys[4]],
+                    args=[
+                        self.token,
+                        now,
+                        now + TRANSFER_SLOT_LEASE_SECONDS,
+                    ],
+                )
+            except RedisError as e:
+                logger.warning(
+                    f"Could not renew the transfer slot of "
+                    f"{self.bucket_name}: {e}"
+                )
+                continue
+            if not renewed:
+                logger.warning(
+                    f"The transfer slot of {self.token} for "
+                    f"{self.bucket_name} expired before it was renewed"
+                )
+                return
+
+    def release(self):
+        self.stopped.set()
+        try:
+            # The token may also have been queued again, e.g. by a retry
+            holders, queue, waiting, _, global_holders = self.keys
+            pipeline = redis_client.pipeline()
+            for key in (holders, queue, waiting, global_holders):
+                pipeline.zrem(key, self.token)
+            pipeline.execute()
+        except RedisError as e:
+            logger.warning(
+                f"Could not release the transfer slot of "
+                f"{self.bucket_name}: {e}"
+            )
+
+    def __enter__(self):
+        self.renewer = threading.Thread(target=self.renew, daemon=True)
+        self.renewer.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+
+
+def get_transfer_slots_occupancy():
+    """
+    Slots held and tasks waiting, for every bucket and in total. Leases
+    that have expired are not counted.
+    """
+    now = time.time()
+    occupancy = {
+        "global": {
+            "held": redis_client.zcount(
+                f"{TRANSFER_SLOTS_PREFIX}:global:holders", now, "+inf"
+            ),
+            "limit": TRANSFER_SLOTS_GLOBAL,
+        },
+        "buckets": {},
+    }
+
+    for key in redis_client.scan_iter(match=f"{TRANSFER_SLOTS_PREFIX}:*"):
+        key = key.decode()
+        parts = key.split(":")
+        if len(parts) != 3 or parts[1] == "global":
+            continue
+        bucket_name = parts[1]
+        if bucket_name in occupancy["buckets"]:
+            continue
+        holders, _, waiting, _, _ = get_slot_keys(bucket_name)
+        held = redis_client.zcount(holders, now, "+inf")
+        queued = redis_client.zcount(waiting, now, "+inf")
+        if held or queued:
+            occupancy["buckets"][bucket_name] = {
+                "held": held,
+                "waiting": queued,
+                "limit": TRANSFER_SLOTS_PER_BUCKET,
+            }
+
+    return occupancy
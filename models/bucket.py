@@ -93,13 +93,31 @@ class Bucket:
             session.close()
             return False
 
+    @classmethod
+    def update_objects_reconciled_at(cls, id, reconciled_at):
+        # The bucket may not have been registered from the admin pages yet
+        cls.create(id)
+
+        db_engine = connect_db()
+        session = get_session(db_engine)
+        bucket = session.query(BucketTable).filter_by(id=id).first()
+        bucket.objects_reconciled_at = reconciled_at
+
+        session.commit()
+        session.close()
+
     @classmethod
     def update_archive_filename(cls, id, filename):
+        # helpers.bucket imports this module
+        from helpers.bucket import forget_signed_urls
+
         db_engine = connect_db()
         session = get_session(db_engine)
         bucket = session.query(BucketTable).filter_by(id=id).first()
 
         if bucket:
+            if bucket.archive_file != filename:
+                forget_signed_urls(id)
             bucket.archive_file = filename
 
             session.commit()
@@ -0,0 +1,105 @@
+import logging
+import datetime
+from helpers.dbm import connect_db, get_session
+from models.db_model import BucketArchiveManifestsTable
+
+# Get the logger instance from app.py
+logger = logging.getLogger("my_app_logger")  # Use the same name as in app.py
+
+
+class BucketArchiveManifest:
+    """
+    What the last archive of a bucket contains: the segments (blobs) it
+    was composed from and, for every member, the object it was made of and
+    its zip entry. The next archive reuses the members whose object has
+    not changed instead of downloading them again.
+    """
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    @classmethod
+    def get(cls, bucket):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        manifest_db = (
+            session.query(BucketArchiveManifestsTable)
+            .filter_by(id=bucket)
+            .first()
+        )
+
+        session.close()
+
+        if not manifest_db:
+            return None
+
+        manifest_db_dict = manifest_db.__dict__
+
+        # Remove keys starting with '_'
+        filtered_dict = {
+            key: value
+            for key, value in manifest_db_dict.items()
+            if not key.startswith("_")
+        }
+
+        return BucketArchiveManifest(**filtered_dict)
+
+    @classmethod
+    def get_created_before(cls, created_before):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        manifests_db = (
+            session.query(BucketArchiveManifestsTable)
+            .filter(BucketArchiveManifestsTable.created_at < created_before)
+            .all()
+        )
+
+        manifests = [
+            BucketArchiveManifest(
+                id=manifest_db.id,
+                archive_file=manifest_db.archive_file,
+                segments=manifest_db.segments,
+                created_at=manifest_db.created_at,
+            )
+            for manifest_db in manifests_db
+        ]
+
+        session.close()
+        return manifests
+
+    @classmethod
+    def save(cls, bucket, archive_file, segments, members):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        manifest_db = (
+            session.query(BucketArchiveManifestsTable)
+            .filter_by(id=bucket)
+            .first()
+        )
+
+        if not manifest_db:
+            manifest_db = BucketArchiveManifestsTable(id=bucket)
+            session.add(manifest_db)
+
+        manifest_db.archive_file = archive_file
+        manifest_db.segments = list(segments)
+        manifest_db.members = dict(members)
+        manifest_db.created_at = datetime.datetime.now()
+
+        session.commit()
+        session.close()
+
+    @classmethod
+    def delete(cls, bucket):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        session.query(BucketArchiveManifestsTable).filter_by(
+            id=bucket
+        ).delete()
+
+        session.commit()
+        session.close()
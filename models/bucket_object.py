@@ -0,0 +1,323 @@
+import logging
+import datetime
+from sqlalchemy import func
+from helpers.dbm import connect_db, get_session
+from models.db_model import BucketObjectsTable
+
+# Get the logger instance from app.py
+logger = logging.getLogger("my_app_logger")  # Use the same name as in app.py
+
+
+class BucketObject:
+    """
+    Index of the objects stored in the buckets, so that listing, counting
+    and sizing them does not need to go through every blob of the bucket.
+
+    It is kept up to date by our own uploads and deletions, and
+    reconciled with the actual content of the buckets periodically.
+    """
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    @classmethod
+    def from_db(cls, object_db):
+        return BucketObject(
+            bucket=object_db.bucket,
+            name=object_db.name,
+            prefix=object_db.prefix,
+            size=object_db.size,
+            md5_hash=object_db.md5_hash,
+            crc32c=object_db.crc32c,
+            generation=object_db.generation,
+            time_created=object_db.time_created,
+        )
+
+    @classmethod
+    def get(cls, bucket, name):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        object_db = (
+            session.query(BucketObjectsTable)
+            .filter_by(bucket=bucket, name=name)
+            .first()
+        )
+        bucket_object = cls.from_db(object_db) if object_db else None
+
+        session.close()
+        return bucket_object
+
+    @classmethod
+    def get_database_time(cls):
+        # The indexed_at of the rows written from now on is at least this
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        database_time = session.query(func.now()).scalar()
+
+        session.close()
+        return database_time
+
+    @classmethod
+    def get_prefix(cls, name):
+        return name.rsplit("/", 1)[0] if "/" in name else ""
+
+    @classmethod
+    def get_values(
+        cls, name, size, md5_hash, crc32c, time_created, generation=None
+    ):
+        if time_created is not None and time_created.tzinfo is not None:
+            time_created = time_created.astimezone(
+                datetime.timezone.utc
+            ).replace(tzinfo=None)
+
+        return {
+            "prefix": cls.get_prefix(name),
+            "size": size,
+            "md5_hash": md5_hash,
+            "crc32c": crc32c,
+            "generation": generation,
+            "time_created": time_created,
+        }
+
+    @classmethod
+    def upsert(
+        cls,
+        bucket,
+        name,
+        size,
+        md5_hash,
+        crc32c,
+        time_created,
+        generation=None,
+    ):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        values = cls.get_values(
+            name, size, md5_hash, crc32c, time_created, generation
+        )
+        object_db = (
+            session.query(BucketObjectsTable)
+            .filter_by(bucket=bucket, name=name)
+            .first()
+        )
+
+        if object_db:
+            for key, value in values.items():
+                setattr(object_db, key, value)
+        else:
+            session.add(BucketObjectsTable(bucket=bucket, name=name, **values))
+
+        session.commit()
+        session.close()
+
+    @classmethod
+    def delete(cls, bucket, name):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        session.query(BucketObjectsTable).filter_by(
+            bucket=bucket, name=name
+        ).delete()
+
+        session.commit()
+        session.close()
+
+    @classmethod
+    def delete_names(cls, bucket, names):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        names = list(names)
+        # Keep the IN lists of a reasonable size
+        for start in range(0, len(names), 1000):
+            end = start + 1000
+            session.query(BucketObjectsTable).filter(
+                BucketObjectsTable.bucket == bucket,
+                BucketObjectsTable.name.in_(names[start:end]),
+            ).delete(synchronize_session=False)
+
+        session.commit()
+        session.close()
+
+    @classmethod
+    def delete_prefix(cls, bucket, prefix):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        session.query(BucketObjectsTable).filter(
+            BucketObjectsTable.bucket == bucket,
+            BucketObjectsTable.name.startswith(prefix, autoescape=True),
+        ).delete(synchronize_session=False)
+
+        session.commit()
+        session.close()
+
+    @classmethod
+    def get_all(cls, bucket, prefix=None, suffix=None):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        query = session.query(BucketObjectsTable).filter_by(bucket=bucket)
+        if prefix is not None:
+            query = query.filter(
+                BucketObjectsTable.name.startswith(prefix, autoescape=True)
+            )
+        if suffix is not None:
+            query = query.filter(
+                BucketObjectsTable.name.endswith(suffix, autoescape=True)
+            )
+
+        bucket_objects = [
+            cls.from_db(object_db)
+            for object_db in query.order_by(BucketObjectsTable.name)
+        ]
+
+        session.close()
+        return bucket_objects
+
+    @classmethod
+    def get_created_before(cls, created_before, prefix=None):
+        # Objects of every bucket created before created_before, in UTC
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        query = session.query(BucketObjectsTable).filter(
+            BucketObjectsTable.time_created < created_before
+        )
+        if prefix is not None:
+            query = query.filter(
+                BucketObjectsTable.name.startswith(prefix, autoescape=True)
+            )
+
+        bucket_objects = [cls.from_db(object_db) for object_db in query]
+
+        session.close()
+        return bucket_objects
+
+    @classmethod
+    def get_by_size(cls, bucket, size, exclude_prefix=None):
+        # Candidates for content already stored in the bucket under any name
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        query = session.query(BucketObjectsTable).filter_by(
+            bucket=bucket, size=size
+        )
+        if exclude_prefix is not None:
+            query = query.filter(
+                ~BucketObjectsTable.name.startswith(
+                    exclude_prefix, autoescape=True
+                )
+            )
+
+        bucket_objects = [
+            cls.from_db(object_db)
+            for object_db in query.order_by(BucketObjectsTable.name)
+        ]
+
+        session.close()
+        return bucket_objects
+
+    @classmethod
+    def get_total_size(cls, bucket, exclude_prefix=None):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        query = session.query(
+            func.coalesce(func.sum(BucketObjectsTable.size), 0)
+        ).filter(BucketObjectsTable.bucket == bucket)
+        if exclude_prefix is not None:
+            query = query.filter(
+                ~BucketObjectsTable.name.startswith(
+                    exclude_prefix, autoescape=True
+                )
+            )
+        total_size = int(query.scalar())
+
+        session.close()
+        return total_size
+
+    @classmethod
+    def count_by_prefix(cls, suffix):
+        # [bucket, prefix, count] of the objects whose name ends with suffix
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        rows = (
+            session.query(
+                BucketObjectsTable.bucket,
+                BucketObjectsTable.prefix,
+                func.count(BucketObjectsTable.id),
+            )
+            .filter(BucketObjectsTable.name.endswith(suffix, autoescape=True))
+            .group_by(BucketObjectsTable.bucket, BucketObjectsTable.prefix)
+            .order_by(BucketObjectsTable.bucket, BucketObjectsTable.prefix)
+            .all()
+        )
+
+        session.close()
+        return [[bucket, prefix, count] for bucket, prefix, count in rows]
+
+    @classmethod
+    def reconcile(cls, bucket, objects, listed_at=None):
+        """
+        Make the index of the bucket match objects, a list of dicts with
+        name, size, md5_hash, crc32c, time_created and generation of every
+        object that is actually in it. Returns the number of rows added,
+        updated and deleted.
+
+        The rows indexed since listed_at, the start of the listing that
+        objects come from, are left as they are: the listing may have
+        missed the objects uploaded while it ran.
+        """
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        # Rows of the objects written since the listing started
+        indexed = {}
+        recent = set()
+        for object_db in session.query(BucketObjectsTable).filter_by(
+            bucket=bucket
+        ):
+            if (
+                listed_at is not None
+                and object_db.indexed_at is not None
+                and object_db.indexed_at >= listed_at
+            ):
+                recent.add(object_db.name)
+            else:
+                indexed[object_db.name] = object_db
+
+        added = updated = 0
+        for bucket_object in objects:
+            if bucket_object["name"] in recent:
+                continue
+            values = cls.get_values(**bucket_object)
+            object_db = indexed.pop(bucket_object["name"], None)
+
+            if object_db is None:
+                session.add(
+                    BucketObjectsTable(
+                        bucket=bucket, name=bucket_object["name"], **values
+                    )
+                )
+                added += 1
+            elif any(
+                getattr(object_db, key) != value
+                for key, value in values.items()
+            ):
+                for key, value in values.items():
+                    setattr(object_db, key, value)
+                updated += 1
+
+        # What is left in the index is no longer in the bucket
+        for object_db in indexed.values():
+            session.delete(object_db)
+
+        session.commit()
+        session.close()
+
+        return added, updated, len(indexed)
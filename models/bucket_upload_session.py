@@ -0,0 +1,117 @@
+import logging
+import datetime
+from helpers.dbm import connect_db, get_session
+from models.db_model import BucketUploadSessionsTable
+
+# Get the logger instance from app.py
+logger = logging.getLogger("my_app_logger")  # Use the same name as in app.py
+
+
+class BucketUploadSession:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    @classmethod
+    def get(cls, bucket, blob_name):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        session_db = (
+            session.query(BucketUploadSessionsTable)
+            .filter_by(bucket=bucket, blob_name=blob_name)
+            .first()
+        )
+
+        session.close()
+
+        if not session_db:
+            return None
+
+        session_db_dict = session_db.__dict__
+
+        # Remove keys starting with '_'
+        filtered_dict = {
+            key: value
+            for key, value in session_db_dict.items()
+            if not key.startswith("_")
+        }
+
+        return BucketUploadSession(**filtered_dict)
+
+    @classmethod
+    def create(cls, bucket, blob_name, local_file_path, file_size, file_mtime):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        new_session = BucketUploadSessionsTable(
+            bucket=bucket,
+            blob_name=blob_name,
+            local_file_path=str(local_file_path),
+            file_size=file_size,
+            file_mtime=file_mtime,
+            parts={},
+        )
+
+        session.add(new_session)
+        session.commit()
+        session.close()
+
+        return cls.get(bucket, blob_name)
+
+    @classmethod
+    def update_parts(cls, id, parts):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        session_db = (
+            session.query(BucketUploadSessionsTable).filter_by(id=id).first()
+        )
+
+        if not session_db:
+            session.close()
+            return False
+
+        # Assign a copy so that SQLAlchemy sees the JSON field as changed
+        session_db.parts = dict(parts)
+        session_db.updated_at = datetime.datetime.now()
+
+        session.commit()
+        session.close()
+        return True
+
+    @classmethod
+    def delete(cls, id):
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        session.query(BucketUploadSessionsTable).filter_by(id=id).delete()
+
+        session.commit()
+        session.close()
+
+    @classmethod
+    def get_abandoned(cls, max_age_hours):
+        # Sessions that have not made any progress for max_age_hours
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        updated_before = datetime.datetime.now() - datetime.timedelta(
+            hours=max_age_hours
+        )
+        sessions_db = (
+            session.query(BucketUploadSessionsTable)
+            .filter(BucketUploadSessionsTable.updated_at < updated_before)
+            .all()
+        )
+
+        abandoned_sessions = [
+            BucketUploadSession(
+                id=session_db.id,
+                bucket=session_db.bucket,
+                blob_name=session_db.blob_name,
+            )
+            for session_db in sessions_db
+        ]
+
+        session.close()
+        return abandoned_sessions
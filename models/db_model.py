@@ -3,12 +3,15 @@ from sqlalchemy import (
     Table,
     Column,
     Integer,
+    BigInteger,
     String,
     Text,
     Boolean,
     DateTime,
     func,
     ForeignKey,
+    Index,
+    UniqueConstraint,
 )
 from sqlalchemy.dialects.mysql import JSON, MEDIUMTEXT
 from sqlalchemy.ext.declarative import declarative_base
@@ -82,6 +85,63 @@ class BucketTable(Base):
     archive_file = Column(String(255), nullable=True)
     archive_file_created_at = Column(DateTime, nullable=True)
     archive_file_creation_progress = Column(Integer, nullable=True)
+    # Start of the last listing of the bucket that its objects index was
+    # reconciled with, None while the index may be missing older objects
+    objects_reconciled_at = Column(DateTime, nullable=True)
+
+
+class BucketArchiveManifestsTable(Base):
+    __tablename__ = "bucket_archive_manifests"
+
+    # Bucket name, one manifest per bucket, for its last archive
+    id = Column(String(250), primary_key=True)
+    archive_file = Column(String(255), nullable=False)
+    # Blobs holding the zip members of the archive, in order
+    segments = Column(JSON(none_as_null=True))
+    # By object name: generation, md5_hash, crc32c, size and zip entry
+    members = Column(JSON(none_as_null=True))
+    created_at = Column(DateTime, default=func.now())
+
+
+class BucketUploadSessionsTable(Base):
+    __tablename__ = "bucket_upload_sessions"
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(String(250), nullable=False)
+    blob_name = Column(String(512), nullable=False, index=True)
+    local_file_path = Column(String(1024), nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    file_mtime = Column(BigInteger, nullable=True)
+    parts = Column(JSON(none_as_null=True))
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(
+        DateTime, default=func.now(), onupdate=func.now(), nullable=True
+    )
+
+
+class BucketObjectsTable(Base):
+    __tablename__ = "bucket_objects"
+    __table_args__ = (
+        UniqueConstraint("bucket", "name", name="uq_bucket_objects_name"),
+        Index("ix_bucket_objects_prefix", "bucket", "prefix"),
+        Index("ix_bucket_objects_time_created", "time_created"),
+        Index("ix_bucket_objects_size", "bucket", "size"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(String(250), nullable=False)
+    name = Column(String(512), nullable=False)
+    # Everything before the last "/" of the name
+    prefix = Column(String(512), nullable=False)
+    size = Column(BigInteger, nullable=True)
+    md5_hash = Column(String(50), nullable=True)
+    crc32c = Column(String(20), nullable=True)
+    generation = Column(BigInteger, nullable=True)
+    # In UTC
+    time_created = Column(DateTime, nullable=True)
+    indexed_at = Column(
+        DateTime, default=func.now(), onupdate=func.now(), nullable=True
+    )
 
 
 class UploadTable(Base):
@@ -246,10 +306,16 @@ class SequencingFilesUploadedTable(Base):
     original_filename = Column(String(255), nullable=True)
     new_name = Column(String(255), nullable=True)
     md5 = Column(String(50), nullable=True)
+    crc32c = Column(String(20), nullable=True)
     exclude_from_mapping = Column(Boolean, default=False)
     total_sequences_number = Column(Integer, nullable=True)
     bucket_upload_progress = Column(Integer, nullable=True)
+    bucket_verification_status = Column(String(50), nullable=True)
     primer_occurrences_count = Column(Integer, nullable=True)
+    fastq_stats = Column(JSON(none_as_null=True))
+    fastq_stats_status = Column(String(20), nullable=True)
+    fastq_stats_queued_at = Column(DateTime, nullable=True)
+    primer_counts = Column(JSON(none_as_null=True))
 
 
 class SequencingCompanyUploadTable(Base):
@@ -10,8 +10,11 @@ from models.db_model import (
 from helpers.fastqc import (
     check_fastqc_report,
     extract_total_sequences_from_fastqc_zip,
-    count_primer_occurrences,
+    count_primers,
+    reverse_complement,
+    PRIMER_COUNT_MAX_READS,
 )
+from helpers.fastq_stats import compute_fastq_stats
 from helpers.csv import get_sequences_based_on_primers
 
 # Get the logger instance from app.py
@@ -227,6 +230,87 @@ class SequencingFileUploaded:
             cls.update_field(id, "total_sequences_number", total_sequences)
         return total_sequences
 
+    @classmethod
+    def update_fastq_stats(cls, id):
+        # Connect to the database and create a session
+        db_engine = connect_db()
+        session = get_session(db_engine)
+
+        result = (
+            session.query(
+                SequencingFilesUploadedTable.new_name,
+                SequencingFilesUploadedTable.primer_counts,
+                SequencingUploadsTable.uploads_folder,
+            )
+            .join(
+                SequencingSequencerIDsTable,
+                SequencingFilesUploadedTable.sequencerId
+                == SequencingSequencerIDsTable.id,
+            )
+            .join(
+                SequencingSamplesTable,
+                SequencingSequencerIDsTable.sequencingSampleId
+                == SequencingSamplesTable.id,
+            )
+            .join(
+                SequencingUploadsTable,
+                SequencingSamplesTable.sequencingUploadId
+                == SequencingUploadsTable.id,
+            )
+            .filter(SequencingFilesUploadedTable.id == id)
+            .first()
+        )
+        session.close()
+
+        if not result:
+            logger.error(f"No record found for id: {id}")
+            return None
+
+        path = os.path.abspath(
+            os.path.join(
+                "seq_processed", result.uploads_folder, result.new_name
+            )
+        )
+        try:
+            fastq_stats = compute_fastq_stats(path)
+        except Exception as e:
+            # Not tried again until the status is reset, a corrupt or
+            # truncated file would fail the same way every time
+            logger.error(f"Could not compute the stats of {path}: {e}")
+            cls.update_field(id, "fastq_stats_status", "Failed")
+            return None
+
+        cls.update_field(id, "fastq_stats", fastq_stats)
+        cls.update_field(id, "total_sequences_number", fastq_stats["reads"])
+        cls.update_field(id, "fastq_stats_status", "Done")
+
+        # Primers counted on the first reads before the number of reads was
+        # known can now be estimated for the whole file
+        if result.primer_counts and result.primer_counts.get("approximate"):
+            cls.update_field(
+                id,
+                "primer_occurrences_count",
+                cls.estimate_primer_occurrences(
+                    result.primer_counts, fastq_stats["reads"]
+                ),
+            )
+        return fastq_stats
+
+    @classmethod
+    def estimate_primer_occurrences(cls, primer_counts, total_sequences):
+        """
+        Reads of the whole file with its own primer, from primer_counts as
+        stored by update_primer_occurrences_count. Counts made on the first
+        reads only are scaled up to total_sequences, and give None while
+        the number of reads of the file is not known.
+        """
+        count = primer_counts.get(primer_counts.get("primer"))
+        if count is None or not primer_counts["approximate"]:
+            return count
+        if not total_sequences or not primer_counts["reads"]:
+            return None
+        return round(count * total_sequences / primer_counts["reads"])
+
     @classmethod
     def update_primer_occurrences_count(cls, id):
         # Connect to the database and create a session
@@ -238,6 +322,7 @@ class SequencingFileUploaded:
             session.query(
                 SequencingFilesUploadedTable.new_name,
                 SequencingFilesUploadedTable.sequencerId,
+                SequencingFilesUploadedTable.total_sequences_number,
                 SequencingUploadsTable.region_1_forward_primer,
                 SequencingUploadsTable.region_1_reverse_primer,
                 SequencingUploadsTable.region_2_forward_primer,
@@ -319,12 +404,10 @@ class SequencingFileUploaded:
             # first or second in the sorted list
             if result.new_name == new_names[0]:
                 # logger.info("result.new_name is the first file.")
-                # You can also assign a variable if needed
-                sequence = region_sequences["Forward Primer"]
+                primer = "forward"
             elif result.new_name == new_names[1]:
                 # logger.info("result.new_name is the second file.")
-                # Assign a variable if needed
-                sequence = region_sequences["Reverse Primer"]
+                primer = "reverse"
             else:
                 logger.info("result.new_name is not in the sorted files.")
                 return []
@@ -336,17 +419,46 @@ class SequencingFileUploaded:
                 + result.new_name
             )
             abs_path = os.path.abspath(path)
-            primer_occurrences_count = count_primer_occurrences(
-                abs_path, sequence
-            )
 
-            if isinstance(primer_occurrences_count, int):
-                logger.info("id: " + str(id))
-                cls.update_field(
-                    id, "primer_occurrences_count", primer_occurrences_count
+            # Both primers and their reverse complements are counted with
+            # a single read of the file
+            forward_primer = region_sequences["Forward Primer"]
+            reverse_primer = region_sequences["Reverse Primer"]
+            primers = {
+                "forward": forward_primer,
+                "reverse": reverse_primer,
+                "forward_reverse_complement": reverse_complement(
+                    forward_primer
+                ),
+                "reverse_reverse_complement": reverse_complement(
+                    reverse_primer
+                ),
+            }
+            try:
+                counts, reads, truncated = count_primers(
+                    abs_path, primers, max_reads=PRIMER_COUNT_MAX_READS
                 )
-                return primer_occurrences_count
+            except (OSError, EOFError, ValueError) as e:
+                logger.error(f"Could not count the primers of {path}: {e}")
+                return None
+
+            # When approximate, the counts are those of the first reads
+            # searched only
+            primer_counts = {
+                **counts,
+                "primer": primer,
+                "reads": reads,
+                "approximate": truncated,
+            }
+            primer_occurrences_count = cls.estimate_primer_occurrences(
+                primer_counts, result.total_sequences_number
+            )
 
+            logger.info("id: " + str(id))
+            cls.update_field(id, "primer_counts", primer_counts)
+            cls.update_field(
+                id, "primer_occurrences_count", primer_occurrences_count
+            )
             return primer_occurrences_count
         else:
             logger.info("While trying the id: " + str(id))
@@ -9,10 +9,13 @@ import csv
 import re
 from collections import defaultdict
 from helpers.dbm import connect_db, get_session
-from helpers.fastqc import init_create_fastqc_report, check_fastqc_report
+from helpers.fastqc import init_create_fastqc_reports, check_fastqc_report
+from helpers.fastq_stats import init_update_fastq_stats, is_fastq_stats_due
 from helpers.csv import get_sequences_based_on_primers, sanitize_string
-from helpers.bucket import check_file_exists_in_bucket
-from helpers.file_renaming import calculate_md5
+from helpers.bucket import (
+    check_file_exists_in_bucket,
+    check_files_exist_in_bucket,
+)
 from models.db_model import (
     SequencingUploadsTable,
     SequencingSamplesTable,
@@ -931,6 +934,7 @@ class SequencingUpload:
         )
 
         # Iterate through the files and check for FastQC reports
+        missing_reports = []
         for file, sample_id, region in uploaded_files:
             # Check if the FastQC report exists
             fastqc_report = check_fastqc_report(
@@ -940,10 +944,23 @@ class SequencingUpload:
             # If the report is missing, create it
             if not fastqc_report:
                 processed_folder = f"seq_processed/{uploads_folder}"
-                init_create_fastqc_report(
-                    file.new_name, processed_folder, bucket, region
+                missing_reports.append(
+                    [file.new_name, processed_folder, bucket, region, file.md5]
                 )
 
+            # Files whose stats are queued, or failed, are left alone
+            if is_fastq_stats_due(
+                file.fastq_stats,
+                file.fastq_stats_status,
+                file.fastq_stats_queued_at,
+            ):
+                init_update_fastq_stats(file.id)
+
+        # The missing reports are all created by a single task, which
+        # shares the cores between them
+        if missing_reports:
+            init_create_fastqc_reports(missing_reports)
+
         # Close the session
         session.close()
 
@@ -1000,22 +1017,16 @@ class SequencingUpload:
                     f"seq_processed/{uploads_folder}/{file.new_name}"
                 )
 
-                # Calculate MD5 if it is null
-                if not file.md5:
-                    file.md5 = calculate_md5(
-                        processed_file_path
-                    )  # Calculate MD5
-                    # Update the md5 field in the database
-                    session.commit()  # Commit the change to the database
-
-                # Start the chunked upload to the bucket
+                # Start the chunked upload to the bucket. If the MD5 is
+                # null, the upload calculates it while sending the file
+                # and stores it
                 init_bucket_chunked_upload_v2(
                     local_file_path=processed_file_path,
                     destination_upload_directory=region,
                     destination_blob_name=file.new_name,
                     sequencer_file_id=file.id,
                     bucket_name=bucket,
-                    known_md5=file.md5,  # Pass the calculated MD5
+                    known_md5=file.md5,
                 )
 
         # Close the session
@@ -1281,6 +1292,8 @@ class SequencingUpload:
         uploads_folder = process_data["uploads_folder"]
         bucket = process_data["project_id"]
         results = []  # To store the results for each region
+        # (blob name, region result) of the files to look for in the bucket
+        bucket_checks = []
 
         # Iterate through each region
         for index, region in enumerate(process_data["regions"]):
@@ -1369,20 +1382,28 @@ class SequencingUpload:
                         bucket_directory = (
                             f"lotus2_report/" f"{analysis_type.name}/LotuSLogS"
                         )
-                        # Check if LotuS_progout.log exists in the bucket
-                        bucket_progout_exists = check_file_exists_in_bucket(
-                            local_file_path=lotus_progout_file,
-                            destination_upload_directory=bucket_directory,
-                            destination_blob_name="LotuS_progout.log",
-                            bucket_name=bucket,
-                        )
-                        region_result["bucket_log_exists"] = (
-                            bucket_progout_exists
+                        # LotuS_progout.log is looked for in the bucket
+                        # once all the regions have been gone through
+                        bucket_checks.append(
+                            (
+                                os.path.join(
+                                    bucket_directory, "LotuS_progout.log"
+                                ),
+                                region_result,
+                            )
                         )
 
                 # Append the region result to the results list
                 results.append(region_result)
         session.close()
+
+        # Check all the bucket files of the page at once
+        bucket_files_exist = check_files_exist_in_bucket(
+            bucket, [blob_name for blob_name, _ in bucket_checks]
+        )
+        for blob_name, region_result in bucket_checks:
+            region_result["bucket_log_exists"] = bucket_files_exist[blob_name]
+
         return results
 
     @classmethod
@@ -1395,6 +1416,8 @@ class SequencingUpload:
         uploads_folder = process_data["uploads_folder"]
         bucket = process_data["project_id"]
         results = []  # To store the results for each region
+        # (blob name, region result) of the files to look for in the bucket
+        bucket_checks = []
 
         # Iterate through each region
         for index, region in enumerate(process_data["regions"]):
@@ -1486,22 +1509,28 @@ class SequencingUpload:
                             f"lotus2_report/"
                             f"{analysis_type.name}/r_scripts_output"
                         )
-                        # Check if LotuS_progout.log exists in the bucket
-                        bucket_physeq_decontam_exists = (
-                            check_file_exists_in_bucket(
-                                local_file_path=physeq_decontam_file,
-                                destination_upload_directory=bucket_directory,
-                                destination_blob_name="physeq_decontam.Rdata",
-                                bucket_name=bucket,
+                        # physeq_decontam.Rdata is looked for in the bucket
+                        # once all the regions have been gone through
+                        bucket_checks.append(
+                            (
+                                os.path.join(
+                                    bucket_directory, "physeq_decontam.Rdata"
+                                ),
+                                region_result,
                             )
                         )
-                        region_result["bucket_log_exists"] = (
-                            bucket_physeq_decontam_exists
-                        )
 
                 # Append the region result to the results list
                 results.append(region_result)
         session.close()
+
+        # Check all the bucket files of the page at once
+        bucket_files_exist = check_files_exist_in_bucket(
+            bucket, [blob_name for blob_name, _ in bucket_checks]
+        )
+        for blob_name, region_result in bucket_checks:
+            region_result["bucket_log_exists"] = bucket_files_exist[blob_name]
+
         return results
 
     @classmethod
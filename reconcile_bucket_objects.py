@@ -0,0 +1,4 @@
+from helpers.bucket import reconcile_bucket_objects
+
+if __name__ == "__main__":
+    reconcile_bucket_objects()
@@ -1,28 +1,41 @@
+import os
 import logging
 from celery import current_app as celery_app
-from redis import Redis
+from celery.signals import worker_ready
 from contextlib import contextmanager
 from helpers.bucket import (
+    BucketTransferError,
+    is_retryable_error,
+    get_backoff_delay,
     upload_raw_file_to_storage,
     upload_final_files_to_storage,
     download_bucket_contents,
     process_fastq_files,
     bucket_chunked_upload_v2,
     bucket_upload_folder_v2,
+    list_buckets,
 )
 from helpers.unzip import unzip_raw_file
 from helpers.fastqc import (
     fastqc_multiqc_files,
     create_fastqc_report,
+    create_fastqc_reports,
+    create_pending_fastqc_reports,
     create_multiqc_report,
 )
 from helpers.lotus2 import generate_lotus2_report
 from helpers.r_scripts import generate_rscripts_report
+from helpers.cache import redis_client
+from models.sequencing_files_uploaded import SequencingFileUploaded
+from helpers.transfer_slots import TransferSlot, TRANSFER_SLOT_RETRY_SECONDS
 
 logger = logging.getLogger("my_app_logger")
 
-# Initialize Redis connection
-redis_client = Redis(host="redis", port=6379, db=0)
+# Bucket tasks that fail with a transient error are run again, after a
+# delay that doubles every time, until they have failed this many times
+BUCKET_TASK_RETRY_ATTEMPTS = 5
+BUCKET_TASK_RETRY_INITIAL_DELAY = 60
+BUCKET_TASK_RETRY_MAX_DELAY = 3600
 
 
 @contextmanager
@@ -45,6 +58,45 @@ def redis_lock(lock_name, expire_time=86400):
         logger.info(f"Task with lock {lock_name} is already running.")
 
 
+def retry_bucket_task(task, error, failed_attempts, **kwargs):
+    """
+    Schedule the task again after a retryable error, with kwargs updated
+    for the next run, or raise the error if it is fatal or the task has
+    failed too many times.
+    """
+    if failed_attempts + 1 >= BUCKET_TASK_RETRY_ATTEMPTS or (
+        not is_retryable_error(error)
+    ):
+        raise error
+
+    countdown = get_backoff_delay(
+        failed_attempts,
+        BUCKET_TASK_RETRY_INITIAL_DELAY,
+        BUCKET_TASK_RETRY_MAX_DELAY,
+    )
+    logger.warning(
+        f"Retrying {task.name} in {countdown:.0f} seconds after: {error}"
+    )
+    raise task.retry(
+        exc=error,
+        countdown=countdown,
+        kwargs={
+            **task.request.kwargs,
+            **kwargs,
+            "failed_attempts": failed_attempts + 1,
+        },
+    )
+
+
+@worker_ready.connect
+def warm_bucket_registry(**kwargs):
+    # Fill the cached bucket list before the first validation needs it
+    try:
+        list_buckets()
+    except Exception as e:
+        logger.error(f"Could not warm the bucket registry: {e}")
+
+
 @celery_app.task
 def generate_lotus2_report_async(
     process_id, input_dir, amplicon_type, debug, analysis_type_id
@@ -80,11 +132,29 @@ def generate_rscripts_report_async(
     )
 
 
-@celery_app.task
+@celery_app.task(bind=True, max_retries=None)
 def bucket_upload_folder_v2_async(
-    folder_path, destination_upload_directory, bucket
+    self,
+    folder_path,
+    destination_upload_directory,
+    bucket,
+    delete_strays=False,
+    file_names=None,
+    failed_attempts=0,
 ):
-    bucket_upload_folder_v2(folder_path, destination_upload_directory, bucket)
+    try:
+        bucket_upload_folder_v2(
+            folder_path,
+            destination_upload_directory,
+            bucket,
+            delete_strays,
+            file_names,
+        )
+    except Exception as e:
+        # Only the files that failed are uploaded again
+        if isinstance(e, BucketTransferError):
+            file_names = list(e.failed)
+        retry_bucket_task(self, e, failed_attempts, file_names=file_names)
 
 
 @celery_app.task
@@ -108,13 +178,36 @@ def fastqc_multiqc_files_async(process_id):
 
 
 @celery_app.task
-def create_fastqc_report_async(fastq_file, input_folder, bucket, region):
-    create_fastqc_report(fastq_file, input_folder, bucket, region)
+def create_fastqc_report_async(
+    fastq_file, input_folder, bucket, region, md5=None
+):
+    create_fastqc_report(fastq_file, input_folder, bucket, region, md5)
+
+
+@celery_app.task
+def create_fastqc_reports_async(reports):
+    create_fastqc_reports(reports)
 
 
 @celery_app.task
-def upload_final_files_to_storage_async(process_id):
-    upload_final_files_to_storage(process_id)
+def create_pending_fastqc_reports_async():
+    create_pending_fastqc_reports()
+
+
+@celery_app.task
+def update_fastq_stats_async(file_id):
+    SequencingFileUploaded.update_fastq_stats(file_id)
+
+
+@celery_app.task(bind=True, max_retries=None)
+def upload_final_files_to_storage_async(
+    self, process_id, resume=False, failed_attempts=0
+):
+    try:
+        upload_final_files_to_storage(process_id, resume)
+    except Exception as e:
+        # The files already uploaded are skipped by the next run
+        retry_bucket_task(self, e, failed_attempts, resume=True)
 
 
 @celery_app.task
@@ -122,23 +215,40 @@ def download_bucket_contents_async(bucket):
     download_bucket_contents(bucket)
 
 
-@celery_app.task
+@celery_app.task(bind=True, max_retries=None)
 def bucket_chunked_upload_v2_async(
+    self,
     local_file_path,
     destination_upload_directory,
     destination_blob_name,
     sequencer_file_id,
     bucket_name,
     known_md5,
+    failed_attempts=0,
 ):
-    bucket_chunked_upload_v2(
-        local_file_path,
-        destination_upload_directory,
-        destination_blob_name,
-        sequencer_file_id,
-        bucket_name,
-        known_md5,
+    # Wait for a transfer slot without holding up the worker. The retries
+    # keep the task id, and with it the place of the task in the queue
+    slot = TransferSlot(
+        bucket_name or os.environ.get("GOOGLE_STORAGE_BUCKET_NAME"),
+        self.request.id,
     )
+    if not slot.acquire():
+        raise self.retry(countdown=TRANSFER_SLOT_RETRY_SECONDS)
+
+    try:
+        with slot:
+            return bucket_chunked_upload_v2(
+                local_file_path,
+                destination_upload_directory,
+                destination_blob_name,
+                sequencer_file_id,
+                bucket_name,
+                known_md5,
+            )
+    except Exception as e:
+        # The parts already in the bucket are kept, the next run resumes
+        # the upload from them
+        retry_bucket_task(self, e, failed_attempts)
 
 
 @celery_app.task
@@ -3,6 +3,7 @@ from flask import redirect, Blueprint, render_template, request, url_for
 from flask_login import current_user, login_required
 from models.bucket import Bucket
 from helpers.bucket import make_file_accessible
+from helpers.transfer_slots import get_transfer_slots_occupancy
 
 # Get the logger instance from app.py
 logger = logging.getLogger("my_app_logger")  # Use the same name as in app.py
@@ -94,3 +95,10 @@ def get_archive_progress():
         return {"progress": progress, "url": url}
     else:
         return {"progress": progress}
+
+
+@data_bp.route("/get_transfer_slots", endpoint="get_transfer_slots")
+@login_required
+@admin_required
+def get_transfer_slots():
+    return get_transfer_slots_occupancy()
@@ -33,9 +33,10 @@ from helpers.fastqc import (
     init_create_multiqc_report,
     check_multiqc_report,
 )
+from helpers.fastq_stats import init_update_fastq_stats
 from helpers.csv import sanitize_data
 import numpy as np
-from helpers.file_renaming import calculate_md5
+from helpers.file_renaming import calculate_md5, concatenate_files_with_md5
 from helpers.lotus2 import (
     init_generate_lotus2_report,
     delete_generated_lotus2_report,
@@ -142,9 +143,12 @@ def process_uploaded_file(
 
             # Generate FastQC report
             init_create_fastqc_report(
-                new_filename, processed_folder, bucket, region
+                new_filename, processed_folder, bucket, region, expected_md5
             )
 
+            # Read count, quality and GC content, without waiting for FastQC
+            init_update_fastq_stats(new_file_uploaded_id)
+
             # Copy the file to the correct bucket and folder
             init_bucket_chunked_upload_v2(
                 local_file_path=processed_file_path,
@@ -753,15 +757,12 @@ def sequencing_file_upload_completed():
         if os.path.exists(temp_file_path):
             os.remove(temp_file_path)
 
-        with open(temp_file_path, "ab") as temp_file:
-            for i in range(1, form_filechunks + 1):
-                chunk_path = (
-                    f"seq_uploads/{uploads_folder}/{form_filename}.part{i}"
-                )
-                with open(chunk_path, "rb") as chunk_file:
-                    temp_file.write(chunk_file.read())
-
-        actual_md5 = calculate_md5(temp_file_path)
+        chunk_paths = [
+            f"seq_uploads/{uploads_folder}/{form_filename}.part{i}"
+            for i in range(1, form_filechunks + 1)
+        ]
+        # The MD5 is calculated while the chunks are joined
+        actual_md5 = concatenate_files_with_md5(chunk_paths, temp_file_path)
         # Compare MD5 hashes
         if expected_md5 == actual_md5:
             # MD5 hashes match, file integrity verified
@@ -1432,10 +1433,14 @@ def upload_report_to_bucket():
             )
         from helpers.bucket import init_bucket_upload_folder_v2
 
+        # The R outputs have a folder of their own, files that are no
+        # longer generated are removed from it. The LotuS2 folder holds
+        # the R outputs folder, so nothing is removed from it
         init_bucket_upload_folder_v2(
             folder_path=output_path,
             destination_upload_directory=bucket_directory,
             bucket=bucket,
+            delete_strays=report == "rscripts",
         )
     return redirect(
         url_for("metadata.metadata_form", process_id=process_id) + "#step_9"
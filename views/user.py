@@ -24,7 +24,7 @@ from models.user import User
 from models.user_groups import UserGroups
 from models.bucket import Bucket
 from models.preapproved_user import PreapprovedUser
-from helpers.bucket import list_buckets
+from helpers.bucket import list_buckets, invalidate_bucket_registry
 from helpers.goodgrands import get_goodgrands_users
 
 # Get the logger instance from app.py
@@ -253,6 +253,18 @@ def users():
     )
 
 
+@user_bp.route(
+    "/refresh_buckets", methods=["POST"], endpoint="refresh_buckets"
+)
+@login_required
+@admin_required
+def refresh_buckets():
+    # Buckets are created outside of the app, list them again right away
+    # instead of waiting for the cached list to expire
+    invalidate_bucket_registry()
+    return redirect(url_for("user.users"))
+
+
 @user_bp.route("/user_groups", endpoint="user_groups")
 @login_required
 @admin_required